@@ -0,0 +1,243 @@
+"""
+Controle de admissão das chamadas à IA.
+
+Antes de cada chamada principal, o turno pede uma vaga informando a sessão e uma
+estimativa de tokens. A vaga só é concedida se houver menos de `max_concorrentes`
+chamadas em andamento e saldo no orçamento de tokens por minuto (um balde que se
+recarrega continuamente). Quem não pode entrar espera em uma fila justa: uma fila
+por sessão, atendidas em rodízio, para que uma conversa com várias requisições não
+passe na frente das outras.
+
+Se a espera prevista já passa de `max_espera_segundos`, ou a fila está cheia, a
+requisição é recusada na hora com `Sobrecarga` (HTTP 429 + Retry-After); quem
+entrou na fila e estourou o prazo também sai com `Sobrecarga`.
+
+Funciona tanto com threads (`entrar`) quanto no loop do asyncio (`entrar_async`).
+"""
+import math
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Tokens de resposta reservados por chamada, acertados com o uso real ao final
+TOKENS_RESPOSTA_ESTIMADOS = 300
+# Intervalo para rever a fila quando ela está parada esperando o orçamento de tokens recarregar
+INTERVALO_RECARGA = 0.25
+
+
+class Sobrecarga(Exception):
+    """A chamada à IA não pode ser atendida dentro do tempo máximo de fila."""
+
+    def __init__(self, mensagem, retry_after):
+        super().__init__(mensagem)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def estimar_tokens(messages):
+    """Estimativa grosseira (~4 caracteres por token) da entrada + uma resposta típica."""
+    caracteres = sum(len(m.get('content') or '') for m in messages)
+    return caracteres // 4 + TOKENS_RESPOSTA_ESTIMADOS
+
+
+class Vaga:
+    """Uma requisição na fila ou em execução. Use como context manager ou chame `sair()`."""
+
+    def __init__(self, controle, chave, tokens, acordar):
+        self.controle = controle
+        self.chave = chave
+        self.tokens = tokens
+        self.acordar = acordar
+        self.chegada = time.monotonic()
+        self.prazo = self.chegada + controle.max_espera_segundos
+        self.admitida_em = None
+        self._encerrada = False
+
+    def registrar_uso(self, tokens_reais):
+        """Acerta o orçamento com o total de tokens que a chamada realmente usou."""
+        if tokens_reais is not None:
+            self.controle._acertar(self, tokens_reais)
+
+    def sair(self):
+        if not self._encerrada:
+            self._encerrada = True
+            self.controle._sair(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.sair()
+
+
+class ControleDeAdmissao:
+
+    def __init__(self, max_concorrentes=16, tokens_por_minuto=0, max_espera_segundos=20, max_fila=200):
+        self.max_concorrentes = max_concorrentes
+        self.tokens_por_minuto = tokens_por_minuto  # 0 = sem orçamento de tokens
+        self.max_espera_segundos = max_espera_segundos
+        self.max_fila = max_fila
+
+        self._lock = threading.Lock()
+        self._em_execucao = 0
+        self._fila = OrderedDict()  # chave da sessão -> deque de Vaga (rodízio pela ordem das chaves)
+        self._na_fila = 0
+        self._saldo = float(tokens_por_minuto)
+        self._ultima_recarga = time.monotonic()
+        self._tempo_medio = 2.0  # média móvel da duração de uma chamada (s), para prever a espera
+        self._stats = {
+            'admitidas': 0,
+            'recusadas_na_chegada': 0,
+            'recusadas_por_tempo': 0,
+            'espera_total_s': 0.0,
+            'espera_max_s': 0.0,
+        }
+
+    # --- Estado (sempre com self._lock) ---
+
+    def _recarregar(self, agora):
+        if self.tokens_por_minuto:
+            self._saldo = min(self.tokens_por_minuto,
+                              self._saldo + (agora - self._ultima_recarga) * self.tokens_por_minuto / 60.0)
+        self._ultima_recarga = agora
+
+    def _cabe(self, vaga):
+        if self._em_execucao >= self.max_concorrentes:
+            return False
+        # Uma chamada maior que o orçamento inteiro entra com o balde cheio, senão nunca entraria
+        return not self.tokens_por_minuto or self._saldo >= min(vaga.tokens, self.tokens_por_minuto)
+
+    def _admitir(self, vaga, agora):
+        self._em_execucao += 1
+        if self.tokens_por_minuto:
+            self._saldo -= vaga.tokens
+        vaga.admitida_em = agora
+        espera = agora - vaga.chegada
+        self._stats['admitidas'] += 1
+        self._stats['espera_total_s'] += espera
+        self._stats['espera_max_s'] = max(self._stats['espera_max_s'], espera)
+
+    def _despachar(self, agora):
+        """Admite, em rodízio entre as sessões, as vagas da fila que já cabem."""
+        self._recarregar(agora)
+        while self._fila:
+            chave, fila_da_sessao = next(iter(self._fila.items()))
+            vaga = fila_da_sessao[0]
+            if not self._cabe(vaga):
+                break
+            fila_da_sessao.popleft()
+            self._na_fila -= 1
+            del self._fila[chave]
+            if fila_da_sessao:
+                self._fila[chave] = fila_da_sessao  # volta para o fim do rodízio
+            self._admitir(vaga, agora)
+            vaga.acordar()
+
+    def _espera_prevista(self, tokens):
+        rodadas = (self._na_fila + self._em_execucao + 1) / self.max_concorrentes
+        espera = max(0.0, rodadas - 1) * self._tempo_medio
+        if self.tokens_por_minuto:
+            na_frente = sum(v.tokens for fila in self._fila.values() for v in fila)
+            deficit = na_frente + tokens - self._saldo
+            espera = max(espera, deficit * 60.0 / self.tokens_por_minuto)
+        return espera
+
+    def _remover_da_fila(self, vaga):
+        fila_da_sessao = self._fila.get(vaga.chave)
+        if fila_da_sessao and vaga in fila_da_sessao:
+            fila_da_sessao.remove(vaga)
+            self._na_fila -= 1
+            if not fila_da_sessao:
+                del self._fila[vaga.chave]
+
+    # --- Entrada e saída ---
+
+    def _chegar(self, chave, tokens, acordar):
+        vaga = Vaga(self, chave, tokens, acordar)
+        with self._lock:
+            agora = time.monotonic()
+            self._despachar(agora)
+            if not self._fila and self._cabe(vaga):
+                self._admitir(vaga, agora)
+                return vaga
+
+            espera = self._espera_prevista(tokens)
+            if self._na_fila >= self.max_fila or espera > self.max_espera_segundos:
+                self._stats['recusadas_na_chegada'] += 1
+                raise Sobrecarga(f"Fila da IA cheia ({self._na_fila} aguardando).", espera or self._tempo_medio)
+
+            self._fila.setdefault(chave, deque()).append(vaga)
+            self._na_fila += 1
+            return vaga
+
+    def _verificar(self, vaga):
+        """(admitida, segundos até a próxima verificação). Levanta Sobrecarga se o prazo acabou."""
+        with self._lock:
+            agora = time.monotonic()
+            self._despachar(agora)
+            if vaga.admitida_em is not None:
+                return True, 0
+            if agora >= vaga.prazo:
+                self._remover_da_fila(vaga)
+                self._stats['recusadas_por_tempo'] += 1
+                raise Sobrecarga("Tempo máximo de espera pela IA esgotado.", self._espera_prevista(vaga.tokens))
+            limite = vaga.prazo - agora
+            return False, min(limite, INTERVALO_RECARGA) if self.tokens_por_minuto else limite
+
+    def entrar(self, chave, tokens):
+        """Bloqueia a thread até a vaga ser concedida. Levanta Sobrecarga."""
+        evento = threading.Event()
+        vaga = self._chegar(chave, tokens, evento.set)
+        while True:
+            admitida, espera = self._verificar(vaga)
+            if admitida:
+                return vaga
+            evento.wait(espera)
+            evento.clear()
+
+    async def entrar_async(self, chave, tokens):
+        """Como `entrar`, mas espera no loop do asyncio, sem ocupar uma thread."""
+        loop = asyncio.get_running_loop()
+        evento = asyncio.Event()
+        vaga = self._chegar(chave, tokens, lambda: loop.call_soon_threadsafe(evento.set))
+        while True:
+            admitida, espera = self._verificar(vaga)
+            if admitida:
+                return vaga
+            try:
+                await asyncio.wait_for(evento.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+            evento.clear()
+
+    def _acertar(self, vaga, tokens_reais):
+        with self._lock:
+            if self.tokens_por_minuto:
+                self._saldo -= tokens_reais - vaga.tokens
+            vaga.tokens = tokens_reais
+
+    def _sair(self, vaga):
+        with self._lock:
+            agora = time.monotonic()
+            if vaga.admitida_em is None:
+                self._remover_da_fila(vaga)
+                return
+            self._em_execucao -= 1
+            self._tempo_medio = 0.8 * self._tempo_medio + 0.2 * (agora - vaga.admitida_em)
+            self._despachar(agora)
+
+    def stats(self):
+        with self._lock:
+            self._recarregar(time.monotonic())
+            stats = dict(self._stats)
+            stats.update({
+                'em_execucao': self._em_execucao,
+                'na_fila': self._na_fila,
+                'sessoes_na_fila': len(self._fila),
+                'tempo_medio_chamada_s': self._tempo_medio,
+                'saldo_tokens': self._saldo if self.tokens_por_minuto else None,
+            })
+            return stats
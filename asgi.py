@@ -0,0 +1,283 @@
+"""
+Modo de serviço assíncrono (ASGI).
+
+/chat e /chat/stream rodam como corrotinas e chamam a IA pelo AsyncOpenAI, com um
+pool de conexões HTTP compartilhado e keep-alive: centenas de conversas podem
+esperar a resposta da IA sem ocupar uma thread cada. As demais rotas (download,
+logo, lote...) são o próprio app Flask, executado em threads.
+
+A lógica do turno (sessão, roteiro local, compactação, registro da OS) é a mesma
+do app.py; só as partes que tocam o SQLite rodam em threads, para não travar o loop.
+
+Uso (precisa de um servidor ASGI, ex.: pip install uvicorn):
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import io
+import sys
+import json
+import asyncio
+import logging
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError
+
+import app as principal
+from admissao import Sobrecarga
+
+logger = logging.getLogger(__name__)
+
+# --- Cliente OpenAI Assíncrono ---
+# O limite do pool é o máximo de chamadas simultâneas à IA; as demais esperam uma conexão livre
+LLM_MAX_CONEXOES = int(os.getenv('LLM_MAX_CONEXOES', '200'))
+LLM_TIMEOUT_SEGUNDOS = float(os.getenv('LLM_TIMEOUT_SEGUNDOS', '60'))
+
+cliente_async = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+    timeout=httpx.Timeout(LLM_TIMEOUT_SEGUNDOS, connect=5.0),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=LLM_MAX_CONEXOES,
+                            max_keepalive_connections=LLM_MAX_CONEXOES,
+                            keepalive_expiry=30.0),
+    ),
+)
+
+# --- Rotas Assíncronas ---
+
+async def _ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'http.disconnect':
+            break
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            break
+    return b''.join(partes)
+
+async def _responder_json(send, payload, status=200):
+    corpo = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(corpo)).encode())]
+    if 'retry_after' in payload:
+        headers.append((b'retry-after', str(payload['retry_after']).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+async def _responder_erro(send, e, rota):
+    logger.error(f"Erro na rota {rota} (async): {e}")
+    payload, status = principal.mensagem_de_erro(e)
+    await _responder_json(send, payload, status)
+
+def _tokens_usados(uso):
+    return uso and uso['prompt_tokens'] + uso['completion_tokens']
+
+async def _interpretar_servico(session_id, texto):
+    """Como principal.interpretar_servico_com_ia, mas no loop: fila de admissão e cliente assíncronos."""
+    mensagens = principal.mensagens_do_servico(texto)
+    try:
+        with principal.metricas.etapa('chat.admissao'):
+            vaga = await principal.admissao.entrar_async(session_id, principal.estimar_tokens(mensagens))
+        with vaga:
+            with principal.metricas.etapa('chat.llm'):
+                response = await cliente_async.chat.completions.create(messages=mensagens, **principal.PARAMETROS_SERVICO)
+            uso = principal.registrar_uso(response.usage)
+            vaga.registrar_uso(_tokens_usados(uso))
+        return principal.item_do_servico(response.choices[0].message.content)
+    except (Sobrecarga, RateLimitError):
+        raise
+    except Exception as e:
+        logger.warning(f"Não foi possível interpretar o serviço '{texto}' com a IA (async): {e}")
+        return None
+
+async def _preparar_turno(data):
+    """Sessão, payload do roteiro local ou do cache (ou None) e, quando a IA for chamada, as mensagens e a vaga."""
+    session_id, sessao = await asyncio.to_thread(principal.abrir_sessao, data)
+    user_message = data.get('message')
+    # A linha de serviço que o roteiro local não separa é interpretada antes, sem ocupar a thread do turno
+    texto = principal.servico_a_interpretar(sessao, user_message)
+    item = await _interpretar_servico(session_id, texto) if texto else None
+    with principal.metricas.etapa('chat.roteiro_local'):
+        payload = await asyncio.to_thread(principal.turno_local, session_id, sessao, user_message, lambda _: item)
+    messages = vaga = None
+    if payload is None:
+        messages = principal.montar_mensagens(sessao, user_message)
+        payload = await asyncio.to_thread(principal.resposta_em_cache, sessao, user_message)
+    if payload is None:
+        # Espera na fila justa sem ocupar thread; a sobrecarga sai como 429 antes de qualquer resposta
+        with principal.metricas.etapa('chat.admissao'):
+            vaga = await principal.admissao.entrar_async(session_id, principal.estimar_tokens(messages))
+    return session_id, sessao, user_message, payload, messages, vaga
+
+async def chat(scope, receive, send):
+    """Mesmo contrato do POST /chat do app.py."""
+    try:
+        data = json.loads(await _ler_corpo(receive) or b'{}')
+        session_id, sessao, user_message, payload, messages, vaga = await _preparar_turno(data)
+        if vaga is not None:
+            with vaga:
+                with principal.metricas.etapa('chat.llm'):
+                    response = await cliente_async.chat.completions.create(messages=messages, **principal.PARAMETROS_CHAT)
+                uso = principal.registrar_uso(response.usage)
+                vaga.registrar_uso(_tokens_usados(uso))
+            principal.guardar_resposta(sessao, user_message, response.choices[0].message.content, response.choices[0].finish_reason)
+            payload = await asyncio.to_thread(principal.payload_da_resposta, response.choices[0].message.content,
+                                              sessao, uso)
+
+        payload = await asyncio.to_thread(principal.concluir_turno, session_id, sessao, user_message, payload)
+        await _responder_json(send, payload)
+
+    except Exception as e:
+        await _responder_erro(send, e, '/chat')
+
+async def chat_stream(scope, receive, send):
+    """Mesmo contrato do POST /chat/stream do app.py (Server-Sent Events)."""
+    try:
+        data = json.loads(await _ler_corpo(receive) or b'{}')
+        session_id, sessao, user_message, payload, messages, vaga = await _preparar_turno(data)
+    except Exception as e:
+        await _responder_erro(send, e, '/chat/stream')
+        return
+
+    async def enviar(eventos):
+        for evento in eventos:
+            await send({'type': 'http.response.body', 'body': evento.encode('utf-8'), 'more_body': True})
+
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        if payload is not None:
+            payload = await asyncio.to_thread(principal.concluir_turno, session_id, sessao, user_message, payload)
+            await enviar(principal.eventos_do_turno_local(payload))
+        else:
+            with vaga:
+                saida = principal.SaidaDoStream()
+                with principal.metricas.etapa('chat.llm'):
+                    stream = await cliente_async.chat.completions.create(
+                        messages=messages,
+                        stream=True,
+                        stream_options={'include_usage': True},
+                        **principal.PARAMETROS_CHAT
+                    )
+                    async for chunk in stream:
+                        await enviar(saida.receber(chunk))
+                vaga.registrar_uso(_tokens_usados(saida.uso))
+            await enviar(await asyncio.to_thread(saida.concluir, session_id, sessao, user_message))
+
+    except Exception as e:
+        logger.error(f"Erro na rota /chat/stream (async): {e}")
+        payload, _ = principal.mensagem_de_erro(e)
+        await enviar([principal.evento_sse('error', payload)])
+    finally:
+        if vaga is not None:
+            vaga.sair()
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+ROTAS_ASYNC = {
+    ('POST', '/chat'): chat,
+    ('POST', '/chat/stream'): chat_stream,
+}
+
+# --- Demais Rotas: o app Flask (WSGI) em threads ---
+
+def _environ(scope, corpo):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1').upper().replace('-', '_')
+        valor = valor.decode('latin-1')
+        if nome == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = valor
+        elif nome != 'CONTENT_LENGTH':
+            chave = f'HTTP_{nome}'
+            environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+async def wsgi(scope, receive, send):
+    corpo = await _ler_corpo(receive)
+    inicio = {}
+
+    def start_response(status, headers, exc_info=None):
+        inicio['status'] = int(status.split(' ', 1)[0])
+        inicio['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    resposta = await asyncio.to_thread(principal.app, _environ(scope, corpo), start_response)
+    partes = iter(resposta)
+    try:
+        # Respostas em streaming (ZIP do lote, SSE) saem pedaço por pedaço, lidos em threads
+        primeira = await asyncio.to_thread(next, partes, None)
+        await send({'type': 'http.response.start', 'status': inicio['status'], 'headers': inicio['headers']})
+        parte = primeira
+        while parte is not None:
+            if parte:
+                await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+            parte = await asyncio.to_thread(next, partes, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(resposta, 'close'):
+            await asyncio.to_thread(resposta.close)
+
+# --- Aplicação ASGI ---
+
+async def _medir(rota, scope, receive, send):
+    """As rotas assíncronas não passam pelos hooks do Flask: o perfil da requisição é aberto aqui."""
+    perfil = principal.metricas.iniciar_perfil()
+    quer_perfil = any(nome == b'x-perfil' for nome, _ in scope.get('headers', []))
+    status = {}
+
+    async def enviar(mensagem):
+        if mensagem['type'] == 'http.response.start':
+            status['codigo'] = mensagem['status']
+            if quer_perfil:
+                headers = list(mensagem.get('headers', [])) + [(b'server-timing', perfil.server_timing().encode())]
+                mensagem = dict(mensagem, headers=headers)
+        await send(mensagem)
+
+    try:
+        await rota(scope, receive, enviar)
+    finally:
+        principal.registrar_requisicao(scope['path'], scope['method'], status.get('codigo', 500), perfil)
+
+async def _lifespan(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            principal.iniciar_servicos()
+            logger.info("Servidor assíncrono iniciado.")
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await cliente_async.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    rota = ROTAS_ASYNC.get((scope['method'], scope['path']))
+    if rota is not None:
+        await _medir(rota, scope, receive, send)
+    else:
+        await wsgi(scope, receive, send)
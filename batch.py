@@ -0,0 +1,110 @@
+"""
+Geração de OS em lote a partir de um arquivo JSONL (um `dados_os` por linha).
+
+Os PDFs são renderizados em paralelo em um pool de processos, para usar todos
+os núcleos (o doc.build do ReportLab é CPU puro e não escala com threads).
+O registro em `generated_files` e a montagem da resposta ficam no app.py.
+"""
+import io
+import os
+import json
+import zipfile
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class LoteInvalido(ValueError):
+    """O arquivo JSONL tem linhas que não são objetos `dados_os` válidos."""
+
+
+def ler_jsonl(linhas, max_itens=None):
+    """Lê as linhas do JSONL e devolve a lista de dicts. Linhas em branco são ignoradas."""
+    itens = []
+    for numero, linha in enumerate(linhas, start=1):
+        if isinstance(linha, bytes):
+            linha = linha.decode('utf-8')
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            item = json.loads(linha)
+        except json.JSONDecodeError as e:
+            raise LoteInvalido(f"Linha {numero}: JSON inválido ({e.msg}).")
+        if not isinstance(item, dict):
+            raise LoteInvalido(f"Linha {numero}: esperado um objeto JSON.")
+        for secao in ('oficina', 'cliente', 'veiculo'):
+            if not isinstance(item.get(secao, {}), dict):
+                raise LoteInvalido(f"Linha {numero}: '{secao}' deve ser um objeto.")
+        if not isinstance(item.get('servicos', []), list):
+            raise LoteInvalido(f"Linha {numero}: 'servicos' deve ser uma lista.")
+        itens.append(item)
+        if max_itens and len(itens) > max_itens:
+            raise LoteInvalido(f"O lote passa do limite de {max_itens} OS.")
+    return itens
+
+
+def _renderizar_item(tarefa):
+    """Executado em um processo do pool: gera um PDF e devolve (índice, erro ou None)."""
+    indice, dados_os, caminho = tarefa
+    # Importado aqui para que o processo filho carregue o app só uma vez, no primeiro item
+    from app import gerar_os_pintura_carro_profissional
+    try:
+        gerar_os_pintura_carro_profissional(dados_os, caminho)
+        return indice, None
+    except Exception as e:
+        return indice, str(e)
+
+
+def renderizar_em_paralelo(tarefas, workers=None):
+    """
+    Renderiza as tarefas [(dados_os, caminho), ...] em um pool de processos.
+    Retorna a lista de erros alinhada às tarefas (None quando o PDF foi gerado).
+    """
+    workers = workers or os.cpu_count() or 1
+    erros = [None] * len(tarefas)
+    if not tarefas:
+        return erros
+
+    # 'spawn' evita herdar locks das threads do servidor (scheduler, fila de PDFs) no fork
+    contexto = multiprocessing.get_context('spawn')
+    chunksize = max(1, len(tarefas) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as pool:
+        entradas = ((i, dados, caminho) for i, (dados, caminho) in enumerate(tarefas))
+        for indice, erro in pool.map(_renderizar_item, entradas, chunksize=chunksize):
+            if erro:
+                logger.error(f"Erro ao gerar o item {indice} do lote: {erro}")
+            erros[indice] = erro
+    return erros
+
+
+class _SaidaSemSeek(io.RawIOBase):
+    """Destino do ZipFile que só acumula bytes, para o ZIP sair em streaming."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def zip_em_streaming(caminhos):
+    """Gera o ZIP com os arquivos em pedaços, sem montar o arquivo inteiro em memória ou em disco."""
+    saida = _SaidaSemSeek()
+    # PDFs já são comprimidos: ZIP_STORED evita gastar CPU à toa
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+        for caminho in caminhos:
+            arquivo_zip.write(caminho, arcname=os.path.basename(caminho))
+            yield saida.retirar()
+    yield saida.retirar()
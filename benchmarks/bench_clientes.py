@@ -0,0 +1,105 @@
+"""
+Micro-benchmark do cadastro de clientes (clientes.py).
+
+Importa N clientes com um veículo cada em um banco temporário (carga em massa,
+como o comando `flask importar-clientes`) e mede:
+  - a importação (itens por segundo),
+  - a consulta pela placa, conhecida e desconhecida (mediana, p99 e máximo em µs),
+  - a consulta pelo CPF.
+
+Cada consulta é uma leitura na chave primária: o tempo não deve crescer com N.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_clientes [--clientes 300000] [--consultas 20000] [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import string
+import tempfile
+import time
+
+from clientes import ClienteStore
+
+
+def placa(i):
+    """Placa Mercosul única para cada i (ABC1D23)."""
+    letras = string.ascii_uppercase
+    return (f"{letras[i // 676 % 26]}{letras[i // 26 % 26]}{letras[i % 26]}"
+            f"{i // 17576 % 10}{letras[i // 175760 % 26]}{i // 4569760 % 10}{i // 45697600 % 10}")
+
+
+def cpf(i):
+    return f"{i:011d}"
+
+
+def itens(n):
+    for i in range(n):
+        yield {
+            'cliente': {'nome': f"Cliente {i}", 'telefone': "(21) 99999-8888", 'documento': cpf(i),
+                        'endereco': "Av. Brasil, 2000 - Bonsucesso"},
+            'veiculo': {'placa': placa(i), 'marca': "Fiat", 'modelo': "Palio", 'ano': "2015"},
+        }
+
+
+def medir(consultar, chaves):
+    consultar(chaves[0])  # Aquecimento: conexão da thread e páginas do índice
+    tempos = []
+    for chave in chaves:
+        inicio = time.perf_counter()
+        consultar(chave)
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return {
+        'mediana_us': tempos[len(tempos) // 2] * 1e6,
+        'p99_us': tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))] * 1e6,
+        'max_us': tempos[-1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=300000)
+    parser.add_argument('--consultas', type=int, default=20000)
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    aleatorio = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        loja = ClienteStore(os.path.join(diretorio, 'os_files.db'))
+        loja.init_db()
+
+        inicio = time.perf_counter()
+        importados, _ = loja.importar(itens(args.clientes))
+        segundos = time.perf_counter() - inicio
+
+        sorteados = [aleatorio.randrange(args.clientes) for _ in range(args.consultas)]
+        resultados = {
+            'importacao': {'itens': importados, 'segundos': segundos, 'itens_por_segundo': importados / segundos},
+            'placa_conhecida': medir(loja.get_por_placa, [placa(i) for i in sorteados]),
+            # Placas fora da base: o caso de todo cliente novo
+            'placa_nova': medir(loja.get_por_placa, [placa(args.clientes + i) for i in sorteados]),
+            'cpf': medir(loja.get_por_documento, [cpf(i) for i in sorteados]),
+        }
+        resultados['db_bytes'] = sum(os.path.getsize(os.path.join(diretorio, f))
+                                     for f in os.listdir(diretorio) if f.startswith('os_files.db'))
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    imp = resultados['importacao']
+    print(f"Importação: {imp['itens']} clientes em {imp['segundos']:.1f}s ({imp['itens_por_segundo']:.0f}/s), "
+          f"banco com {resultados['db_bytes'] / 1024 / 1024:.1f} MiB")
+    print(f"{'consulta':<16} {'mediana µs':>11} {'p99 µs':>8} {'máx µs':>8}")
+    for nome in ('placa_conhecida', 'placa_nova', 'cpf'):
+        r = resultados[nome]
+        print(f"{nome:<16} {r['mediana_us']:>11.1f} {r['p99_us']:>8.1f} {r['max_us']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
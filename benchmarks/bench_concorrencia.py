@@ -0,0 +1,182 @@
+"""
+Teste de carga do /chat: modo WSGI (uma thread por requisição) x modo assíncrono (asgi.py).
+
+Sobe o mock da OpenAI (benchmarks/mock_openai.py) com uma latência fixa e, para
+cada modo, um servidor em um subprocesso apontado para ele. Em seguida simula
+N conversas simultâneas, cada uma com alguns turnos que passam pela IA
+(ROTEIRO_LOCAL=0), e mede turnos por segundo e a latência de cada turno.
+
+  - wsgi: o app Flask em um servidor com um pool fixo de threads (--threads),
+          como um gunicorn/gthread: cada turno prende uma thread durante a chamada à IA.
+  - asgi: `uvicorn asgi:app` (precisa do uvicorn instalado).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_concorrencia [--usuarios 200] [--turnos 3] [--latencia 1.0]
+                                            [--threads 16] [--modo wsgi --modo asgi] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks import mock_openai
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def servir_wsgi(porta, threads):
+    """Executado no subprocesso do modo wsgi: o app Flask atrás de um pool fixo de threads."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+    import app
+
+    class _Handler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    class _ServidorComPool(ThreadingMixIn, WSGIServer):
+        request_queue_size = 1024
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    app.iniciar_servicos()
+    make_server('127.0.0.1', porta, app.app, server_class=_ServidorComPool, handler_class=_Handler).serve_forever()
+
+
+def _subir_servidor(modo, porta, threads, base_url, diretorio, env_extra=None):
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY='benchmark', ROTEIRO_LOCAL='0',
+               PYTHONPATH=RAIZ, LLM_MAX_CONEXOES='1000',
+               # Sem controle de admissão: o teste mede só o modelo de concorrência do servidor
+               LLM_MAX_CONCORRENTES='1000', LLM_MAX_FILA='10000',
+               # Toda conversa roteirizada usa a mesma placa: sem isso, a segunda já cairia na confirmação do cadastro
+               CADASTRO_CLIENTES='0')
+    env.update(env_extra or {})
+    if modo == 'wsgi':
+        cmd = [sys.executable, '-m', 'benchmarks.bench_concorrencia', '--servir-wsgi', str(porta), '--threads', str(threads)]
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(porta), '--log-level', 'warning',
+               '--backlog', '1024', '--timeout-keep-alive', '75', '--app-dir', RAIZ]
+    # cwd temporário: o os_files.db do teste não se mistura com o do desenvolvimento
+    processo = subprocess.Popen(cmd, cwd=diretorio, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    limite = time.time() + 30
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"O servidor {modo} terminou ao subir (código {processo.returncode}).")
+        try:
+            with socket.create_connection(('127.0.0.1', porta), timeout=0.5):
+                return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError(f"O servidor {modo} não respondeu em 30s.")
+
+
+async def _conversa(cliente, url, turnos, latencias, erros):
+    session_id = None
+    for turno in range(turnos):
+        corpo = {'message': None if turno == 0 else f"resposta {turno}"}
+        if session_id:
+            corpo['session_id'] = session_id
+        inicio = time.perf_counter()
+        try:
+            r = await cliente.post(url, json=corpo)
+            dados = r.json()
+            if r.status_code != 200:
+                erros.append(dados.get('message', r.status_code))
+                return
+            session_id = dados.get('session_id')
+        except Exception as e:
+            erros.append(repr(e))
+            return
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def _carga(porta, usuarios, turnos):
+    latencias, erros = [], []
+    limites = httpx.Limits(max_connections=usuarios, max_keepalive_connections=usuarios)
+    async with httpx.AsyncClient(limits=limites, timeout=300) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[_conversa(cliente, f"http://127.0.0.1:{porta}/chat", turnos, latencias, erros)
+                               for _ in range(usuarios)])
+        duracao = time.perf_counter() - inicio
+    return latencias, erros, duracao
+
+
+def medir(modo, usuarios, turnos, threads, base_url):
+    porta = _porta_livre()
+    with tempfile.TemporaryDirectory() as diretorio:
+        processo = _subir_servidor(modo, porta, threads, base_url, diretorio)
+        try:
+            latencias, erros, duracao = asyncio.run(_carga(porta, usuarios, turnos))
+        finally:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    latencias.sort()
+    p95 = latencias[int(0.95 * (len(latencias) - 1))] if latencias else 0
+    return {
+        'modo': modo,
+        'usuarios': usuarios,
+        'turnos': len(latencias),
+        'erros': len(erros),
+        'duracao_s': duracao,
+        'turnos_por_s': len(latencias) / duracao if duracao else 0,
+        'mediana_ms': statistics.median(latencias) * 1000 if latencias else 0,
+        'p95_ms': p95 * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=200, help='Conversas simultâneas (padrão: 200).')
+    parser.add_argument('--turnos', type=int, default=3, help='Turnos por conversa (padrão: 3).')
+    parser.add_argument('--latencia', type=float, default=1.0, help='Latência da IA simulada, em segundos.')
+    parser.add_argument('--threads', type=int, default=16, help='Threads do servidor WSGI (padrão: 16).')
+    parser.add_argument('--modo', action='append', choices=['wsgi', 'asgi'], help='Modos a medir (padrão: ambos).')
+    parser.add_argument('--json', action='store_true', help='Imprime os resultados em JSON.')
+    parser.add_argument('--servir-wsgi', type=int, metavar='PORTA', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir_wsgi:
+        servir_wsgi(args.servir_wsgi, args.threads)
+        return
+
+    servidor, base_url = mock_openai.iniciar(latencia=args.latencia)
+    try:
+        resultados = [medir(modo, args.usuarios, args.turnos, args.threads, base_url)
+                      for modo in (args.modo or ['wsgi', 'asgi'])]
+    finally:
+        servidor.shutdown()
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"IA simulada com {args.latencia:.1f}s de latência, {args.usuarios} conversas x {args.turnos} turnos "
+          f"(WSGI com {args.threads} threads)")
+    print(f"{'modo':<6} {'turnos':>7} {'erros':>6} {'turnos/s':>9} {'mediana ms':>11} {'p95 ms':>9}")
+    for r in resultados:
+        print(f"{r['modo']:<6} {r['turnos']:>7} {r['erros']:>6} {r['turnos_por_s']:>9.1f} "
+              f"{r['mediana_ms']:>11.0f} {r['p95_ms']:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
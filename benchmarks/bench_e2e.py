@@ -0,0 +1,256 @@
+"""
+Benchmark de ponta a ponta: conversas completas (Blocos 1 a 8) pelo /chat + download do PDF.
+
+Sobe o mock da OpenAI repetindo as respostas roteirizadas de benchmarks/fixtures.py
+(CONVERSA, até a confirmação com gerar_pdf) e um servidor do app em um subprocesso,
+com banco, cache de PDFs e diretório de trabalho temporários. Em seguida N usuários
+simultâneos percorrem a conversa inteira e baixam a OS gerada.
+
+Relata, por tipo de turno (saudacao, cliente, ..., confirmacao, download), p50/p95/p99;
+PDFs por segundo; CPU e memória do servidor; e o crescimento do os_files.db, do
+static/pdf e do cache de PDFs. Tudo roda offline.
+
+Para acompanhar regressões, salve uma linha de base e compare as próximas execuções:
+    python -m benchmarks.bench_e2e --json > base.json
+    python -m benchmarks.bench_e2e --base base.json
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_e2e [--usuarios 20] [--latencia 0.3] [--modo wsgi|asgi]
+                                   [--threads 16] [--json] [--base ARQUIVO]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import mock_openai
+from benchmarks.bench_concorrencia import RAIZ, _porta_livre, _subir_servidor
+from benchmarks.fixtures import CONVERSA
+
+TIPOS = list(dict.fromkeys(t['tipo'] for t in CONVERSA)) + ['download']
+# Variação (em %) do p95 acima da qual a comparação com a linha de base aponta regressão
+TOLERANCIA_P95 = 20
+
+
+# --- Mock da IA ---
+
+_RESPOSTAS = {
+    (CONVERSA[i - 1]['resposta']['mensagem'] if i else None, turno['usuario']): turno['resposta']
+    for i, turno in enumerate(CONVERSA)
+}
+
+
+def responder(pedido):
+    """Resposta roteirizada para o par (última pergunta da IA, última mensagem do usuário)."""
+    pergunta = usuario = None
+    for msg in pedido.get('messages', []):
+        if msg['role'] == 'assistant':
+            pergunta = msg['content']
+        elif msg['role'] == 'user':
+            usuario = msg['content']
+    resposta = _RESPOSTAS.get((pergunta, usuario))
+    if resposta is None:
+        return {'mensagem': f"(mock) fora do roteiro: {usuario!r}", 'campos': [], 'gerar_pdf': False}
+    return resposta
+
+
+# --- Servidor ---
+
+def _processo(pid):
+    """(segundos de CPU, RSS atual em KiB, pico de RSS em KiB) lidos do /proc (Linux)."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(campos[11]) + int(campos[12])) / os.sysconf('SC_CLK_TCK')
+        memoria = {}
+        with open(f'/proc/{pid}/status') as f:
+            for linha in f:
+                chave, _, valor = linha.partition(':')
+                if chave in ('VmRSS', 'VmHWM'):
+                    memoria[chave] = int(valor.split()[0])
+        return cpu, memoria.get('VmRSS'), memoria.get('VmHWM')
+    except OSError:
+        return None, None, None
+
+
+def _tamanho(caminho):
+    """(arquivos, bytes) de um arquivo ou diretório."""
+    if os.path.isfile(caminho):
+        return 1, os.path.getsize(caminho)
+    arquivos = total = 0
+    if os.path.isdir(caminho):
+        with os.scandir(caminho) as entradas:
+            for entrada in entradas:
+                if entrada.is_file():
+                    arquivos += 1
+                    total += entrada.stat().st_size
+    return arquivos, total
+
+
+def _armazenamento(diretorio):
+    banco = sum(_tamanho(os.path.join(diretorio, f"os_files.db{sufixo}"))[1] for sufixo in ('', '-wal', '-shm'))
+    return {
+        'db_bytes': banco,
+        'pdf_dir': _tamanho(os.path.join(RAIZ, 'static', 'pdf')),
+        'cache_pdf': _tamanho(os.path.join(diretorio, 'cache_pdf')),
+    }
+
+
+# --- Carga ---
+
+async def _usuario(cliente, base, latencias, erros, pdfs):
+    session_id = None
+    for turno in CONVERSA:
+        corpo = {'message': turno['usuario']}
+        if session_id:
+            corpo['session_id'] = session_id
+        inicio = time.perf_counter()
+        try:
+            r = await cliente.post(f"{base}/chat", json=corpo)
+            dados = r.json()
+        except Exception as e:
+            erros.append(f"{turno['tipo']}: {e!r}")
+            return
+        if r.status_code != 200 or dados.get('type') == 'error':
+            erros.append(f"{turno['tipo']}: {dados.get('message', r.status_code)}")
+            return
+        latencias[turno['tipo']].append(time.perf_counter() - inicio)
+        session_id = dados.get('session_id')
+
+    if dados.get('type') != 'pdf':
+        erros.append(f"confirmacao não gerou a OS: {dados}")
+        return
+    inicio = time.perf_counter()
+    try:
+        r = await cliente.get(f"{base}{dados['url']}")
+    except Exception as e:
+        erros.append(f"download: {e!r}")
+        return
+    if r.status_code != 200 or not r.content.startswith(b'%PDF'):
+        erros.append(f"download: HTTP {r.status_code}")
+        return
+    latencias['download'].append(time.perf_counter() - inicio)
+    pdfs.append(len(r.content))
+
+
+async def _carga(porta, usuarios):
+    latencias = {tipo: [] for tipo in TIPOS}
+    erros, pdfs = [], []
+    limites = httpx.Limits(max_connections=usuarios, max_keepalive_connections=usuarios)
+    async with httpx.AsyncClient(limits=limites, timeout=300) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[_usuario(cliente, f"http://127.0.0.1:{porta}", latencias, erros, pdfs)
+                               for _ in range(usuarios)])
+        duracao = time.perf_counter() - inicio
+    return latencias, erros, pdfs, duracao
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def medir(modo, usuarios, threads, base_url):
+    porta = _porta_livre()
+    with tempfile.TemporaryDirectory() as diretorio:
+        env = {'RENDER_CACHE_DIR': os.path.join(diretorio, 'cache_pdf')}
+        processo = _subir_servidor(modo, porta, threads, base_url, diretorio, env_extra=env)
+        try:
+            antes = _armazenamento(diretorio)
+            cpu_antes, _, _ = _processo(processo.pid)
+            latencias, erros, pdfs, duracao = asyncio.run(_carga(porta, usuarios))
+            cpu_depois, rss, pico_rss = _processo(processo.pid)
+            depois = _armazenamento(diretorio)
+        finally:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    cpu = cpu_depois - cpu_antes if cpu_antes is not None and cpu_depois is not None else None
+    return {
+        'modo': modo,
+        'usuarios': usuarios,
+        'erros': len(erros),
+        'exemplos_de_erro': erros[:5],
+        'duracao_s': duracao,
+        'pdfs': len(pdfs),
+        'pdfs_por_s': len(pdfs) / duracao if duracao else 0,
+        'pdf_medio_bytes': sum(pdfs) / len(pdfs) if pdfs else 0,
+        'turnos': {tipo: {'n': len(v), 'p50_ms': _percentil(v, 50) * 1000, 'p95_ms': _percentil(v, 95) * 1000,
+                          'p99_ms': _percentil(v, 99) * 1000}
+                   for tipo, v in latencias.items()},
+        'cpu_s': cpu,
+        'cpu_pct': 100 * cpu / duracao if cpu is not None and duracao else None,
+        'rss_kib': rss,
+        'pico_rss_kib': pico_rss,
+        'crescimento': {
+            'db_bytes': depois['db_bytes'] - antes['db_bytes'],
+            'pdf_dir_arquivos': depois['pdf_dir'][0] - antes['pdf_dir'][0],
+            'pdf_dir_bytes': depois['pdf_dir'][1] - antes['pdf_dir'][1],
+            'cache_pdf_arquivos': depois['cache_pdf'][0] - antes['cache_pdf'][0],
+            'cache_pdf_bytes': depois['cache_pdf'][1] - antes['cache_pdf'][1],
+        },
+    }
+
+
+# --- Relatório ---
+
+def imprimir(r, base=None):
+    print(f"{r['modo']}: {r['usuarios']} usuários, {r['duracao_s']:.1f}s, {r['erros']} erros, "
+          f"{r['pdfs']} PDFs ({r['pdfs_por_s']:.2f}/s, {r['pdf_medio_bytes'] / 1024:.0f} KiB em média)")
+    for erro in r['exemplos_de_erro']:
+        print(f"  erro: {erro}")
+    print(f"  {'turno':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}" + (f" {'p95 base':>9} {'var.':>7}" if base else ''))
+    for tipo in TIPOS:
+        t = r['turnos'][tipo]
+        linha = f"  {tipo:<12} {t['n']:>5} {t['p50_ms']:>9.0f} {t['p95_ms']:>9.0f} {t['p99_ms']:>9.0f}"
+        anterior = base and base['turnos'].get(tipo)
+        if anterior and anterior['p95_ms']:
+            variacao = 100 * (t['p95_ms'] - anterior['p95_ms']) / anterior['p95_ms']
+            alerta = '  <- regressão' if variacao > TOLERANCIA_P95 else ''
+            linha += f" {anterior['p95_ms']:>9.0f} {variacao:>+6.0f}%{alerta}"
+        print(linha)
+    if r['cpu_s'] is not None:
+        print(f"  CPU do servidor: {r['cpu_s']:.1f}s ({r['cpu_pct']:.0f}%), "
+              f"{1000 * r['cpu_s'] / max(1, r['usuarios']):.0f} ms por conversa; "
+              f"RSS {r['rss_kib'] / 1024:.0f} MiB (pico {r['pico_rss_kib'] / 1024:.0f} MiB)")
+    c = r['crescimento']
+    print(f"  Crescimento: os_files.db +{c['db_bytes'] / 1024:.0f} KiB, "
+          f"static/pdf +{c['pdf_dir_arquivos']} arquivos (+{c['pdf_dir_bytes'] / 1024:.0f} KiB), "
+          f"cache de PDFs +{c['cache_pdf_arquivos']} arquivos (+{c['cache_pdf_bytes'] / 1024:.0f} KiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20, help='Conversas simultâneas (padrão: 20).')
+    parser.add_argument('--latencia', type=float, default=0.3, help='Latência da IA simulada, em segundos.')
+    parser.add_argument('--modo', choices=['wsgi', 'asgi'], default='wsgi', help='Servidor a medir (padrão: wsgi).')
+    parser.add_argument('--threads', type=int, default=16, help='Threads do servidor WSGI (padrão: 16).')
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON.')
+    parser.add_argument('--base', help='JSON de uma execução anterior, para comparar o p95 de cada turno.')
+    args = parser.parse_args()
+
+    servidor, base_url = mock_openai.iniciar(latencia=args.latencia, responder=responder)
+    try:
+        resultado = medir(args.modo, args.usuarios, args.threads, base_url)
+    finally:
+        servidor.shutdown()
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        return
+    base = None
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+    print(f"IA simulada com {args.latencia:.2f}s de latência, {len(CONVERSA)} turnos por conversa + download")
+    imprimir(resultado, base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Micro-benchmark da renderização de PDFs de OS.
+
+Mede, para cada cenário de benchmarks/fixtures.py:
+  - tempo de um documento (mediana e p95 em ms),
+  - páginas por segundo,
+  - pico de memória alocada durante o build (tracemalloc) e o que ficou retido depois.
+
+Com --escala, mede a mesma OS com 10 a 5.000 itens de serviço (OS de frota) e
+estima o expoente de crescimento do tempo (1 = linear), além da memória por linha.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_render [--repeticoes 30] [--cenario padrao] [--json]
+    python -m benchmarks.bench_render --escala [--json]
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')  # app.py cria o cliente na importação
+
+import app
+from benchmarks.fixtures import CENARIOS, dados_os, logo_png
+
+_RE_PAGINA = re.compile(rb'/Type /Page\b(?!s)')
+# Quantidades de itens de serviço medidas com --escala
+ESCALA = (10, 50, 100, 500, 1000, 2000, 5000)
+
+
+def contar_paginas(pdf_bytes):
+    return len(_RE_PAGINA.findall(pdf_bytes))
+
+
+def renderizar(dados):
+    buffer = io.BytesIO()
+    app.gerar_os_pintura_carro_profissional(dados, buffer)
+    return buffer.getvalue()
+
+
+def medir(dados, repeticoes):
+    renderizar(dados)  # Aquecimento: fontes, cache do logo, imports tardios do ReportLab
+
+    tempos = []
+    paginas = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        pdf = renderizar(dados)
+        tempos.append(time.perf_counter() - inicio)
+        paginas = contar_paginas(pdf)
+
+    # Memória medida à parte: o tracemalloc deixa o build bem mais lento
+    gc.collect()
+    tracemalloc.start()
+    antes, _ = tracemalloc.get_traced_memory()
+    renderizar(dados)
+    gc.collect()
+    depois, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tempos.sort()
+    mediana = statistics.median(tempos)
+    return {
+        'paginas': paginas,
+        'mediana_ms': mediana * 1000,
+        'p95_ms': tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000,
+        'paginas_por_segundo': paginas / mediana if mediana else 0.0,
+        'pico_kib': (pico - antes) / 1024,
+        'retido_kib': (depois - antes) / 1024,
+    }
+
+
+def escala(tamanhos, repeticoes, logo_id):
+    resultados = {}
+    for n in tamanhos:
+        # Menos repetições nos documentos grandes: cada um já leva segundos
+        r = medir(dados_os(n, logo_id=logo_id), max(1, min(repeticoes, 1000 // n)))
+        r['ms_por_linha'] = r['mediana_ms'] / n
+        r['pico_kib_por_linha'] = r['pico_kib'] / n
+        resultados[n] = r
+    return resultados
+
+
+def expoente(resultados, a_partir_de=100):
+    """Inclinação de log(tempo) x log(linhas) por mínimos quadrados: 1 = linear, 2 = quadrático."""
+    pontos = [(math.log(n), math.log(r['mediana_ms'])) for n, r in resultados.items() if n >= a_partir_de]
+    if len(pontos) < 2:
+        return None
+    mx = sum(x for x, _ in pontos) / len(pontos)
+    my = sum(y for _, y in pontos) / len(pontos)
+    return sum((x - mx) * (y - my) for x, y in pontos) / sum((x - mx) ** 2 for x, _ in pontos)
+
+
+def imprimir_escala(resultados):
+    print(f"{'linhas':>6} {'págs':>5} {'mediana ms':>11} {'ms/linha':>9} {'pico KiB':>9} {'KiB/linha':>10} {'retido KiB':>11}")
+    for n, r in resultados.items():
+        print(f"{n:>6} {r['paginas']:>5} {r['mediana_ms']:>11.1f} {r['ms_por_linha']:>9.3f} "
+              f"{r['pico_kib']:>9.0f} {r['pico_kib_por_linha']:>10.2f} {r['retido_kib']:>11.1f}")
+    k = expoente(resultados)
+    if k is not None:
+        print(f"Tempo ~ linhas^{k:.2f} a partir de 100 linhas (1.00 = linear)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--cenario', choices=[c[0] for c in CENARIOS])
+    parser.add_argument('--escala', action='store_true', help='Mede de 10 a 5.000 itens de serviço')
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logo_id = app.logos.save(logo_png())
+
+    if args.escala:
+        resultados = escala(ESCALA, args.repeticoes, logo_id)
+        if args.json:
+            print(json.dumps({'linhas': resultados, 'expoente': expoente(resultados)}, indent=2))
+        else:
+            imprimir_escala(resultados)
+        return
+
+    resultados = {}
+    for nome, n_servicos, com_logo in CENARIOS:
+        if args.cenario and nome != args.cenario:
+            continue
+        dados = dados_os(n_servicos, logo_id=logo_id if com_logo else None)
+        resultados[nome] = medir(dados, args.repeticoes)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'cenário':<10} {'págs':>5} {'mediana ms':>11} {'p95 ms':>8} {'págs/s':>8} {'pico KiB':>9} {'retido KiB':>11}")
+    for nome, r in resultados.items():
+        print(f"{nome:<10} {r['paginas']:>5} {r['mediana_ms']:>11.2f} {r['p95_ms']:>8.2f} "
+              f"{r['paginas_por_segundo']:>8.1f} {r['pico_kib']:>9.1f} {r['retido_kib']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Dados de OS representativos para os benchmarks, no mesmo formato
+que o chat() monta em `dados_finais_os`.
+"""
+import io
+import random
+
+from PIL import Image as PILImage
+
+DESCRICOES = [
+    "Pintura capô", "Polimento completo", "Troca de óleo 5W30", "Funilaria porta dianteira esquerda",
+    "Alinhamento e balanceamento", "Pastilhas de freio dianteiras", "Pintura para-choque traseiro com verniz",
+    "Higienização do ar-condicionado", "Retoque de arranhões na lateral", "Cristalização de vidros",
+]
+RESPONSAVEIS = ["Leo", "Marcos", "Ana Paula", "Zé da Funilaria", ""]
+
+
+def logo_png(lado=600):
+    """PNG em memória para simular o upload do logo da oficina."""
+    img = PILImage.new('RGBA', (lado, lado), (0, 51, 102, 255))
+    for x in range(0, lado, 20):
+        for y in range(0, lado, 20):
+            if (x + y) % 40 == 0:
+                img.putpixel((x, y), (255, 255, 255, 255))
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def dados_os(n_servicos=3, logo_id=None, seed=0, numero_os="OS251018-1200"):
+    rnd = random.Random(seed)
+    oficina = {
+        "nome": "Auto Center Pista Livre",
+        "cnpj": "12.345.678/0001-90",
+        "endereco": "Rua das Oficinas, 100 - Centro, Rio de Janeiro - RJ",
+        "cidade_estado": "Rua das Oficinas, 100 - Centro, Rio de Janeiro - RJ",
+        "telefone": "(21) 3333-4444",
+        "logo_data_base64": "",
+    }
+    if logo_id:
+        oficina["logo_id"] = logo_id
+
+    return {
+        "numero_os": numero_os,
+        "data_os": "18/10/2025",
+        "oficina": oficina,
+        "cliente": {
+            "nome": "João da Silva",
+            "telefone": "(21) 99999-8888",
+            "documento": "123.456.789-00",
+            "endereco": "Av. Brasil, 2000 - Bonsucesso",
+        },
+        "veiculo": {"marca": "Fiat", "modelo": "Palio", "ano": "2015", "placa": "ABC1D23"},
+        "servicos": [
+            {
+                "descricao": rnd.choice(DESCRICOES),
+                "responsavel": rnd.choice(RESPONSAVEIS),
+                "valor": round(rnd.uniform(50, 2500), 2),
+            }
+            for _ in range(n_servicos)
+        ],
+        "observacoes": "Cliente pediu para guardar as peças substituídas.",
+    }
+
+
+# (nome, quantidade de serviços, com logo)
+CENARIOS = [
+    ("simples", 1, False),
+    ("padrao", 5, True),
+    ("frota", 60, True),
+]
+
+
+def _turno(tipo, usuario, mensagem, campos=(), gerar_pdf=False):
+    return {
+        'tipo': tipo,
+        'usuario': usuario,
+        'resposta': {'mensagem': mensagem, 'campos': [{'campo': c, 'valor': v} for c, v in campos],
+                     'gerar_pdf': gerar_pdf},
+    }
+
+
+# Conversa completa (Blocos 1 a 8) conduzida pela IA: a mensagem do usuário e a
+# resposta estruturada que a IA daria (ver extracao.py). O par (última pergunta,
+# mensagem do usuário) é único, para o mock saber em que ponto do roteiro a conversa está.
+CONVERSA = [
+    _turno('saudacao', None,
+           "Olá! 🏁 Vamos iniciar uma nova Ordem de Serviço. Para pular qualquer etapa, digite `p` ou `pular`. "
+           "Cliente que já voltou à oficina? Informe a placa do veículo no lugar do nome.\n\n"
+           "Qual o nome do cliente? 📝"),
+    _turno('cliente', "João da Silva", "Qual o telefone dele? (ou 'p' para pular)",
+           [('cliente.nome', "João da Silva")]),
+    _turno('cliente', "(21) 99999-8888", "Qual o endereço? (ou 'p' para pular)",
+           [('cliente.telefone', "(21) 99999-8888")]),
+    _turno('cliente', "Av. Brasil, 2000 - Bonsucesso", "Qual o CPF/CNPJ do cliente? (ou 'p' para pular)",
+           [('cliente.endereco', "Av. Brasil, 2000 - Bonsucesso")]),
+    _turno('cliente', "123.456.789-00", "Certo. Agora os dados do veículo. 🔧 Qual a placa? (ou 'p' para pular)",
+           [('cliente.documento', "123.456.789-00")]),
+    _turno('veiculo', "ABC1D23", "Qual a marca e modelo? (Ex: Fiat Palio) (ou 'p' para pular)",
+           [('veiculo.placa', "ABC1D23")]),
+    _turno('veiculo', "Fiat Palio", "E qual o ano do veículo? (ou 'p' para pular)",
+           [('veiculo.marca', "Fiat"), ('veiculo.modelo', "Palio")]),
+    _turno('veiculo', "2015",
+           "Perfeito. Qual seria o serviço / peça trocada no veículo e seu preço? (Ex: Pintura capô, 500, Leo) "
+           "(ou 'p' para não adicionar serviços)",
+           [('veiculo.ano', "2015")]),
+    _turno('servicos', "Pintura capô, 500, Leo",
+           "Serviço adicionado. Gostaria de adicionar mais algum serviço / produto na OS? (s/n)",
+           [('servico.descricao', "Pintura capô"), ('servico.valor', "500"), ('servico.responsavel', "Leo")]),
+    _turno('servicos', "s", "Ok. Qual o próximo serviço / produto na OS?"),
+    _turno('servicos', "Polimento completo, 250, Ana",
+           "Serviço adicionado. Gostaria de adicionar mais algum serviço / produto na OS? (s/n)",
+           [('servico.descricao', "Polimento completo"), ('servico.valor', "250"), ('servico.responsavel', "Ana")]),
+    _turno('servicos', "n", "Gostaria de adicionar alguma observação? (s/n)"),
+    _turno('observacoes', "s", "Qual a observação? (ou 'p' para pular)"),
+    _turno('observacoes', "Cliente pediu para guardar as peças substituídas.",
+           "Estamos finalizando. Qual o nome da sua oficina? 🔧 (ou 'p' para pular)",
+           [('observacoes', "Cliente pediu para guardar as peças substituídas.")]),
+    _turno('oficina', "Auto Center Pista Livre", "Qual o CNPJ da oficina? (ou 'p' para pular)",
+           [('oficina.nome', "Auto Center Pista Livre")]),
+    _turno('oficina', "12.345.678/0001-90",
+           "Qual o endereço da sua oficina? (Ex: Rua X, 10 - Bairro, Cidade - RJ) (ou 'p' para pular)",
+           [('oficina.cnpj', "12.345.678/0001-90")]),
+    _turno('oficina', "Rua das Oficinas, 100 - Centro, Rio de Janeiro - RJ", "Qual o telefone da sua oficina? (ou 'p' para pular)",
+           [('oficina.endereco', "Rua das Oficinas, 100 - Centro"), ('oficina.cidade_estado', "Rio de Janeiro - RJ")]),
+    _turno('oficina', "(21) 3333-4444",
+           "Você tem um arquivo de logo para carregar? O upload aparecerá no chat. (ou 'p' para pular)",
+           [('oficina.telefone', "(21) 3333-4444")]),
+    _turno('resumo', "p",
+           "OK, dados coletados. Aqui está um resumo para sua revisão: 📝\n\n**Resumo da OS:**\n**Oficina:**\n"
+           "- Nome: Auto Center Pista Livre\n- CNPJ: 12.345.678/0001-90\n- Logo: Não\n**Cliente:**\n"
+           "- Nome: João da Silva\n- Telefone: (21) 99999-8888\n**Veículo:**\n- Placa: ABC1D23\n- Modelo: Fiat Palio\n"
+           "**Serviços/Venda:**\n1. Pintura capô, Leo, R$ 500,00\n2. Polimento completo, Ana, R$ 250,00\n"
+           "**Observações:**\n- Cliente pediu para guardar as peças substituídas.\n\n"
+           "Os dados estão corretos? Digite 'sim' (ou 's') para gerar o PDF, ou o que deseja corrigir "
+           "(ex: 'oficina', 'cliente', 'veiculo', 'servicos', 'obs'). 🔧",
+           [('oficina.logo', "")]),
+    _turno('confirmacao', "sim", "Gerando a Ordem de Serviço... 🏁", gerar_pdf=True),
+]
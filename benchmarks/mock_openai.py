@@ -0,0 +1,116 @@
+"""
+Servidor local que imita o endpoint /v1/chat/completions da OpenAI.
+
+Responde com um texto fixo depois de uma latência configurável, com ou sem
+streaming (SSE, com o chunk final de `usage`), para medir o servidor sem gastar
+tokens nem depender da rede. Aponte o app para ele com OPENAI_BASE_URL.
+Quando a requisição pede saída estruturada (response_format json_schema), o texto
+vai no campo 'mensagem' do JSON do turno (ver extracao.py).
+
+Uso:
+    python -m benchmarks.mock_openai [--porta 8099] [--latencia 1.0]
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPOSTA_PADRAO = "Qual o telefone dele? (ou 'p' para pular)"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como a API real
+
+    def log_message(self, format, *args):
+        pass
+
+    def _uso(self, pedido, texto):
+        entrada = sum(len(m.get('content') or '') for m in pedido.get('messages', [])) // 4
+        return {'prompt_tokens': entrada, 'completion_tokens': len(texto) // 4,
+                'total_tokens': entrada + len(texto) // 4, 'prompt_tokens_details': {'cached_tokens': 0}}
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        pedido = json.loads(corpo or b'{}')
+        texto = self.server.responder(pedido)
+        if isinstance(texto, dict) or (pedido.get('response_format') or {}).get('type') == 'json_schema':
+            if not isinstance(texto, dict):
+                texto = {'mensagem': texto, 'campos': [], 'gerar_pdf': False}
+            texto = json.dumps(texto, ensure_ascii=False)
+        time.sleep(self.server.latencia)
+
+        base = {'id': f"chatcmpl-{uuid.uuid4().hex[:12]}", 'created': int(time.time()), 'model': pedido.get('model')}
+        if pedido.get('stream'):
+            self._stream(pedido, texto, base)
+            return
+
+        dados = json.dumps(dict(base, object='chat.completion', choices=[{
+            'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': texto}}],
+            usage=self._uso(pedido, texto))).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _stream(self, pedido, texto, base):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def enviar(dados):
+            linha = f"data: {dados}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(linha):X}\r\n".encode() + linha + b"\r\n")
+
+        chunk = dict(base, object='chat.completion.chunk')
+        tamanho = max(1, len(texto) // self.server.trechos)
+        for i in range(0, len(texto), tamanho):
+            enviar(json.dumps(dict(chunk, choices=[{
+                'index': 0, 'finish_reason': None, 'delta': {'content': texto[i:i + tamanho]}}])))
+        enviar(json.dumps(dict(chunk, choices=[{'index': 0, 'finish_reason': 'stop', 'delta': {}}])))
+        if (pedido.get('stream_options') or {}).get('include_usage'):
+            enviar(json.dumps(dict(chunk, choices=[], usage=self._uso(pedido, texto))))
+        enviar('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # centenas de conexões chegando juntas
+
+
+def iniciar(porta=0, latencia=1.0, trechos=8, responder=None):
+    """
+    Sobe o servidor em uma thread. Retorna (servidor, base_url) — use servidor.shutdown() ao final.
+    `responder(pedido)` devolve o texto da resposta ou, para a saída estruturada, o dict do turno.
+    """
+    servidor = _Servidor(('127.0.0.1', porta), _Handler)
+    servidor.latencia = latencia
+    servidor.trechos = trechos
+    servidor.responder = responder or (lambda pedido: RESPOSTA_PADRAO)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--porta', type=int, default=8099)
+    parser.add_argument('--latencia', type=float, default=1.0, help='Segundos até a resposta (padrão: 1.0).')
+    args = parser.parse_args()
+
+    servidor, base_url = iniciar(args.porta, args.latencia)
+    print(f"Mock da OpenAI em {base_url} (latência {args.latencia}s). Ctrl+C para sair.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import json
+import time
+import logging
+
+import db
+from roteiro import normalizar_placa, normalizar_documento
+
+logger = logging.getLogger(__name__)
+
+# Campos guardados de cada seção da OS
+CAMPOS_CLIENTE = ('nome', 'telefone', 'documento', 'endereco')
+CAMPOS_VEICULO = ('placa', 'marca', 'modelo', 'ano')
+TAMANHO_LOTE = 10000
+
+
+class ClienteStore:
+    """
+    Clientes e veículos das OS já registradas, para preencher os Blocos 1 e 2 quando
+    o usuário informa uma placa conhecida. Os veículos são indexados pela placa
+    normalizada (chave primária) e os clientes pelo CPF/CNPJ (só dígitos); cada
+    veículo guarda também o último cliente que o trouxe, para clientes sem documento.
+    Uma consulta é uma leitura na chave primária: não depende do tamanho do cadastro.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS clientes (
+                documento TEXT PRIMARY KEY,
+                dados TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS veiculos (
+                placa TEXT PRIMARY KEY,
+                dados TEXT NOT NULL,
+                documento TEXT,
+                cliente TEXT,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_documento ON veiculos (documento)")
+
+    def get_por_placa(self, placa):
+        """{'cliente', 'veiculo'} do veículo com esta placa, ou None."""
+        placa = normalizar_placa(placa)
+        if not placa:
+            return None
+        with db.conexao(self.db_name) as conn:
+            # O cliente do cadastro pelo documento é o mais atualizado; sem documento, vale o guardado no veículo
+            row = conn.execute(
+                "SELECT v.dados, COALESCE(c.dados, v.cliente) FROM veiculos v "
+                "LEFT JOIN clientes c ON c.documento = v.documento WHERE v.placa = ?",
+                (placa,)
+            ).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return {'cliente': json.loads(row[1]), 'veiculo': json.loads(row[0])}
+
+    def get_por_documento(self, documento):
+        """
+        {'cliente', 'veiculo'} do cliente com este CPF/CNPJ, ou None. O veículo só vem
+        quando o cliente tem um único; com vários, a placa é perguntada no Bloco 2.
+        """
+        documento = normalizar_documento(documento)
+        if not documento:
+            return None
+        with db.conexao(self.db_name) as conn:
+            row = conn.execute("SELECT dados FROM clientes WHERE documento = ?", (documento,)).fetchone()
+            if row is None:
+                return None
+            veiculos = conn.execute("SELECT dados FROM veiculos WHERE documento = ? LIMIT 2", (documento,)).fetchall()
+        return {'cliente': json.loads(row[0]),
+                'veiculo': json.loads(veiculos[0][0]) if len(veiculos) == 1 else None}
+
+    @staticmethod
+    def _linhas(cliente, veiculo, agora):
+        """Linhas (clientes, veiculos) a gravar de uma OS; None na que não tem chave."""
+        cliente = {campo: str(cliente.get(campo) or '') for campo in CAMPOS_CLIENTE}
+        veiculo = {campo: str(veiculo.get(campo) or '') for campo in CAMPOS_VEICULO}
+        documento = normalizar_documento(cliente['documento']) or None
+        placa = normalizar_placa(veiculo['placa'])
+        # Sem nome não há o que preencher no Bloco 1
+        cliente_json = json.dumps(cliente, ensure_ascii=False) if cliente['nome'] else None
+
+        linha_cliente = (documento, cliente_json, agora) if documento and cliente_json else None
+        linha_veiculo = (placa, json.dumps(veiculo, ensure_ascii=False), documento, cliente_json, agora) if placa else None
+        return linha_cliente, linha_veiculo
+
+    def _gravar(self, conn, linhas_clientes, linhas_veiculos):
+        conn.executemany(
+            "INSERT INTO clientes (documento, dados, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (documento) DO UPDATE SET dados = excluded.dados, updated_at = excluded.updated_at",
+            linhas_clientes
+        )
+        # Uma OS sem documento ou sem nome não apaga o que o veículo já tinha
+        conn.executemany(
+            "INSERT INTO veiculos (placa, dados, documento, cliente, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (placa) DO UPDATE SET dados = excluded.dados, "
+            "documento = COALESCE(excluded.documento, veiculos.documento), "
+            "cliente = COALESCE(excluded.cliente, veiculos.cliente), updated_at = excluded.updated_at",
+            linhas_veiculos
+        )
+
+    def save(self, cliente, veiculo):
+        """Grava (ou atualiza) o cliente e o veículo de uma OS. Retorna False se não há placa nem documento."""
+        linha_cliente, linha_veiculo = self._linhas(cliente, veiculo, time.time())
+        if linha_cliente is None and linha_veiculo is None:
+            return False
+        with db.conexao(self.db_name) as conn:
+            self._gravar(conn, [linha_cliente] if linha_cliente else [], [linha_veiculo] if linha_veiculo else [])
+        return True
+
+    def importar(self, itens, tamanho_lote=TAMANHO_LOTE):
+        """
+        Carga em massa: cada item é um dict com 'cliente' e 'veiculo' (como os dados de
+        uma OS). Grava em transações de `tamanho_lote` itens; na mesma placa ou no mesmo
+        documento, vale o último item. Retorna (importados, ignorados).
+        """
+        importados = ignorados = 0
+        agora = time.time()
+        clientes, veiculos = [], []
+
+        def gravar_lote():
+            with db.conexao(self.db_name) as conn:
+                self._gravar(conn, clientes, veiculos)
+            clientes.clear()
+            veiculos.clear()
+
+        for item in itens:
+            linha_cliente, linha_veiculo = self._linhas(item.get('cliente') or {}, item.get('veiculo') or {}, agora)
+            if linha_cliente is None and linha_veiculo is None:
+                ignorados += 1
+                continue
+            if linha_cliente:
+                clientes.append(linha_cliente)
+            if linha_veiculo:
+                veiculos.append(linha_veiculo)
+            importados += 1
+            if importados % tamanho_lote == 0:
+                gravar_lote()
+        gravar_lote()
+
+        logger.info(f"Cadastro de clientes: {importados} importados, {ignorados} ignorados.")
+        return importados, ignorados
@@ -0,0 +1,79 @@
+"""
+Compactação do histórico enviado à IA.
+
+Os blocos do roteiro já concluídos têm suas perguntas e respostas trocadas por
+um snapshot JSON dos campos coletados; só o bloco em andamento segue na íntegra.
+O SYSTEM_PROMPT continua sendo a primeira mensagem, sempre idêntica, para que o
+prefixo estático da requisição aproveite o cache de prompt do provedor.
+"""
+import json
+import roteiro
+
+# Abaixo disso não vale a pena trocar mensagens por um snapshot
+MIN_MENSAGENS_PARA_COMPACTAR = 4
+
+
+def _bloco_de_cada_mensagem(history):
+    """Bloco do roteiro de cada mensagem; respostas do usuário herdam o bloco da pergunta anterior."""
+    blocos = []
+    bloco_atual = None
+    for msg in history:
+        if msg.get('role') == 'assistant':
+            pergunta = roteiro.identificar_pergunta(msg.get('content', ''))
+            if pergunta:
+                bloco_atual = roteiro.BLOCO_DA_PERGUNTA[pergunta]
+        blocos.append(bloco_atual)
+    return blocos
+
+
+def reconstruir_estado(history):
+    """Refaz os campos coletados aplicando cada resposta do usuário à pergunta que a precedeu."""
+    estado = roteiro.novo_estado()
+    pergunta = None
+    for msg in history:
+        if msg.get('role') == 'assistant':
+            pergunta = roteiro.identificar_pergunta(msg.get('content', ''))
+        elif pergunta:
+            roteiro.aplicar_resposta(estado, pergunta, msg.get('content', ''))
+            pergunta = None
+    return estado
+
+
+def mensagem_do_snapshot(estado, blocos_concluidos):
+    dados = estado['dados']
+    texto = (
+        f"DADOS JÁ COLETADOS (Blocos {', '.join(str(b) for b in blocos_concluidos)} concluídos; "
+        "as perguntas e respostas desses blocos foram resumidas aqui). "
+        "Use estes valores no Resumo e continue o roteiro a partir da conversa abaixo:\n"
+        + json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+    )
+    if estado.get('corrigindo'):
+        texto += "\nO usuário pediu uma correção no Bloco 7: ao terminar o bloco atual, volte IMEDIATAMENTE para o Bloco 6 (Resumo)."
+    return texto
+
+
+def compactar_historico(history, dados=None):
+    """
+    Retorna (snapshot, recentes). `snapshot` é a mensagem de sistema com os campos
+    dos blocos concluídos (ou None quando não há o que compactar) e `recentes`
+    são as mensagens do bloco em andamento, enviadas sem alteração.
+    `dados`, quando informado, são os campos já guardados no servidor e
+    substituem os reconstruídos a partir do histórico.
+    """
+    blocos = _bloco_de_cada_mensagem(history)
+    if not blocos or blocos[-1] is None:
+        return None, history
+
+    # Início do trecho final que pertence ao bloco atual
+    inicio = len(history)
+    while inicio > 0 and blocos[inicio - 1] == blocos[-1]:
+        inicio -= 1
+
+    if inicio < MIN_MENSAGENS_PARA_COMPACTAR:
+        return None, history
+
+    estado = reconstruir_estado(history[:inicio])
+    if dados is not None:
+        estado['dados'] = dados
+    blocos_concluidos = sorted({b for b in blocos[:inicio] if b is not None and b != 7})
+    return mensagem_do_snapshot(estado, blocos_concluidos), history[inicio:]
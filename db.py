@@ -0,0 +1,55 @@
+"""
+Conexões SQLite compartilhadas pelos módulos do app.
+
+Cada thread reaproveita uma conexão por arquivo de banco, em vez de abrir e fechar
+uma a cada consulta. As conexões usam WAL (leitores não bloqueiam o escritor) e
+busy_timeout: com vários workers gravando no mesmo os_files.db, quem chega
+durante uma escrita espera a vez em vez de falhar com "database is locked".
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+_local = threading.local()
+
+
+def _abrir(db_name):
+    conn = sqlite3.connect(db_name, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    # WAL fica gravado no arquivo; nas conexões seguintes o pragma só confirma o modo
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Em WAL, NORMAL só arrisca a última transação em uma queda de energia, não a integridade do banco
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def conectar(db_name):
+    """Conexão desta thread para `db_name`, aberta na primeira chamada."""
+    # Depois de um fork (ex: workers do gunicorn) as conexões herdadas não podem ser usadas
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.conexoes = {}
+    conn = _local.conexoes.get(db_name)
+    if conn is None:
+        conn = _local.conexoes[db_name] = _abrir(db_name)
+    return conn
+
+
+@contextmanager
+def conexao(db_name):
+    """
+    Conexão da thread para um bloco de operações. Ao sair, confirma o que ficou
+    pendente ou, se houve erro, desfaz: a conexão volta limpa para o próximo uso.
+    """
+    conn = conectar(db_name)
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    if conn.in_transaction:
+        conn.commit()
@@ -0,0 +1,169 @@
+"""
+Extração incremental dos campos da OS nos turnos conduzidos pela IA.
+
+Em vez de reescrever a OS inteira em JSON no último turno, a IA responde sempre
+no formato de `FORMATO_RESPOSTA` (saída estruturada): o texto para o usuário,
+a lista dos campos que a última mensagem do usuário preencheu e o sinal
+`gerar_pdf`. O servidor aplica esses campos aos dados da OS guardados na sessão
+e, quando `gerar_pdf` chega, registra a OS com o que já tem — o turno final é
+tão curto quanto qualquer outro.
+"""
+import re
+import json
+import logging
+
+import roteiro
+
+logger = logging.getLogger(__name__)
+
+# campo -> (seção, chave) nos dados da OS (mesma estrutura de roteiro.DADOS_VAZIOS)
+CAMPOS = {
+    'cliente.nome': ('cliente', 'nome'),
+    'cliente.telefone': ('cliente', 'telefone'),
+    'cliente.endereco': ('cliente', 'endereco'),
+    'cliente.documento': ('cliente', 'documento'),
+    'veiculo.placa': ('veiculo', 'placa'),
+    'veiculo.marca': ('veiculo', 'marca'),
+    'veiculo.modelo': ('veiculo', 'modelo'),
+    'veiculo.ano': ('veiculo', 'ano'),
+    'oficina.nome': ('oficina', 'nome'),
+    'oficina.cnpj': ('oficina', 'cnpj'),
+    'oficina.endereco': ('oficina', 'endereco'),
+    'oficina.cidade_estado': ('oficina', 'cidade_estado'),
+    'oficina.telefone': ('oficina', 'telefone'),
+    'oficina.logo': ('oficina', 'logo_data_base64'),
+}
+# Serviços: 'servico.descricao' abre um novo item; valor e responsável completam o último
+CAMPOS_DO_SERVICO = ('servico.descricao', 'servico.valor', 'servico.responsavel')
+CAMPOS_ESPECIAIS = ('observacoes', 'servicos.limpar')
+
+FORMATO_RESPOSTA = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'turno_os',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            # 'mensagem' vem primeiro para o texto poder ser repassado enquanto chega
+            'properties': {
+                'mensagem': {'type': 'string'},
+                'campos': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'campo': {'type': 'string', 'enum': list(CAMPOS) + list(CAMPOS_DO_SERVICO) + list(CAMPOS_ESPECIAIS)},
+                            'valor': {'type': 'string'},
+                        },
+                        'required': ['campo', 'valor'],
+                        'additionalProperties': False,
+                    },
+                },
+                'gerar_pdf': {'type': 'boolean'},
+            },
+            'required': ['mensagem', 'campos', 'gerar_pdf'],
+            'additionalProperties': False,
+        },
+    },
+}
+
+
+def interpretar(conteudo):
+    """
+    Lê a resposta estruturada da IA. Retorna dict com mensagem, campos e gerar_pdf;
+    uma resposta fora do formato (ex: cortada por max_tokens) vira uma mensagem
+    comum, sem campos, em vez de derrubar o turno.
+    """
+    try:
+        resposta = json.loads(conteudo or '')
+        return {
+            'mensagem': str(resposta['mensagem']),
+            'campos': [c for c in resposta.get('campos') or [] if isinstance(c, dict)],
+            'gerar_pdf': resposta.get('gerar_pdf') is True,
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Resposta da IA fora do formato estruturado: {e}")
+        return {'mensagem': conteudo or '', 'campos': [], 'gerar_pdf': False}
+
+
+def aplicar_campos(dados, campos):
+    """Aplica aos dados da OS os campos informados no turno, na ordem em que vieram."""
+    servicos = dados['servicos']
+    for item in campos:
+        campo, valor = item.get('campo'), str(item.get('valor') or '').strip()
+
+        if campo in CAMPOS:
+            secao, chave = CAMPOS[campo]
+            dados[secao][chave] = valor
+        elif campo == 'observacoes':
+            dados['observacoes'] = valor
+        elif campo == 'servicos.limpar':
+            servicos.clear()
+        elif campo in CAMPOS_DO_SERVICO:
+            if campo == 'servico.descricao' or not servicos:
+                servicos.append({'descricao': '-', 'responsavel': '', 'valor': 0.0})
+            servico = servicos[-1]
+            if campo == 'servico.descricao':
+                servico['descricao'] = valor or '-'
+            elif campo == 'servico.valor':
+                servico['valor'] = roteiro.parse_valor(valor) or 0.0
+            else:
+                servico['responsavel'] = valor
+        else:
+            logger.warning(f"Campo desconhecido na resposta da IA: {campo}")
+
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+_RE_INICIO_MENSAGEM = re.compile(r'"mensagem"\s*:\s*"')
+
+
+class LeitorDaMensagem:
+    """
+    Extrai, à medida que o JSON chega em trechos, o texto do campo 'mensagem'
+    já sem as sequências de escape, para o streaming mostrar só o texto ao usuário.
+    """
+
+    def __init__(self):
+        self.bruto = ""
+        self.posicao = None  # Próximo caractere a ler dentro da string 'mensagem'
+        self.terminou = False
+
+    def receber(self, trecho):
+        """Acrescenta um trecho do JSON e devolve o texto novo da mensagem (pode ser '')."""
+        self.bruto += trecho
+        if self.terminou:
+            return ''
+        if self.posicao is None:
+            m = _RE_INICIO_MENSAGEM.search(self.bruto)
+            if not m:
+                return ''
+            self.posicao = m.end()
+
+        texto = []
+        i, bruto = self.posicao, self.bruto
+        while i < len(bruto):
+            c = bruto[i]
+            if c == '"':
+                self.terminou = True
+                break
+            if c != '\\':
+                texto.append(c)
+                i += 1
+                continue
+            # Sequência de escape: espera chegar inteira antes de decodificar
+            if i + 1 >= len(bruto):
+                break
+            if bruto[i + 1] != 'u':
+                texto.append(_ESCAPES.get(bruto[i + 1], bruto[i + 1]))
+                i += 2
+                continue
+            tamanho = 12 if bruto[i + 2:i + 4].upper() in ('D8', 'D9', 'DA', 'DB') else 6  # par substituto
+            if i + tamanho > len(bruto):
+                break
+            try:
+                texto.append(json.loads(f'"{bruto[i:i + tamanho]}"'))
+            except ValueError:
+                pass
+            i += tamanho
+        self.posicao = i
+        return ''.join(texto)
@@ -0,0 +1,16 @@
+# Configuração do gunicorn para o modo de produção (wsgi.py). Ver README.md.
+import os
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Threads por worker: cada turno do chat prende uma thread durante a chamada à IA
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Uma chamada à IA (ou um PDF grande) pode passar bem dos 30s padrão
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+# Sem preload: o agendador da limpeza e as conexões SQLite são criados em cada worker,
+# depois do fork (threads e conexões não sobrevivem ao fork)
+preload_app = False
@@ -0,0 +1,108 @@
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Estados possíveis de um job
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+class FilaCheia(Exception):
+    """Levantada quando a fila já tem o máximo de jobs aguardando."""
+
+
+class JobQueue:
+    """
+    Fila de jobs em segundo plano com um pool limitado de threads.
+    O estado de cada job fica na tabela `jobs` do mesmo banco SQLite
+    de `generated_files`, para que qualquer worker possa consultá-lo (`get`).
+    """
+
+    def __init__(self, db_name, max_workers=2, max_pending=50):
+        self.db_name = db_name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        # Limita quantos jobs podem estar na fila + em execução ao mesmo tempo
+        self.vagas = threading.BoundedSemaphore(max_pending)
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            # Jobs que estavam na fila quando o processo caiu nunca vão terminar
+            cursor.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE status IN (?, ?)",
+                (ERRO, 'Interrompido pela reinicialização do servidor.', PENDENTE, PROCESSANDO)
+            )
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        with db.conexao(self.db_name) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, result, error, job_id)
+            )
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Enfileira `func(*args, **kwargs)` e retorna o id do job imediatamente.
+        O valor retornado por `func` (uma string) fica salvo em `result`.
+        """
+        if not self.vagas.acquire(blocking=False):
+            raise FilaCheia("Fila de geração de PDFs cheia.")
+
+        job_id = uuid.uuid4().hex
+        with db.conexao(self.db_name) as conn:
+            conn.execute("INSERT INTO jobs (id, status) VALUES (?, ?)", (job_id, PENDENTE))
+
+        try:
+            self.executor.submit(self._run, job_id, func, args, kwargs)
+        except Exception:
+            self.vagas.release()
+            self._set_status(job_id, ERRO, error='Não foi possível enfileirar o job.')
+            raise
+
+        logger.info(f"Job {job_id} enfileirado.")
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        try:
+            self._set_status(job_id, PROCESSANDO)
+            result = func(*args, **kwargs)
+            self._set_status(job_id, CONCLUIDO, result=result)
+            logger.info(f"Job {job_id} concluído.")
+        except Exception as e:
+            logger.error(f"Erro no job {job_id}: {e}")
+            self._set_status(job_id, ERRO, error=str(e))
+        finally:
+            self.vagas.release()
+
+    def get(self, job_id):
+        with db.conexao(self.db_name) as conn:
+            row = conn.execute("SELECT id, status, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'status': row[1], 'result': row[2], 'error': row[3]}
+
+    def delete_old(self, minutes):
+        """Remove jobs finalizados há mais de `minutes` minutos."""
+        with db.conexao(self.db_name) as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at <= datetime('now', ?)",
+                (CONCLUIDO, ERRO, f'-{int(minutes)} minutes')
+            )
+            return cursor.rowcount
@@ -0,0 +1,60 @@
+import os
+import time
+import uuid
+import socket
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class Lideranca:
+    """
+    Eleição de líder entre processos por um lease no SQLite.
+
+    Todos os workers agendam a mesma tarefa, mas só quem detém o lease `nome`
+    a executa. O lease vale `duracao_segundos` e é renovado a cada execução do
+    líder; se o líder morrer, o primeiro worker que tentar depois do vencimento
+    assume. A disputa é resolvida por um único UPSERT, atômico no SQLite.
+    """
+
+    def __init__(self, db_name, nome, duracao_segundos=180):
+        self.db_name = db_name
+        self.nome = nome
+        self.duracao_segundos = duracao_segundos
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lider = False
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                nome TEXT PRIMARY KEY,
+                dono TEXT NOT NULL,
+                expira_em REAL NOT NULL
+            )
+            ''')
+
+    def tentar(self):
+        """Assume ou renova o lease. Retorna True se este processo é o líder até o próximo vencimento."""
+        agora = time.time()
+        with db.conexao(self.db_name) as conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (nome, dono, expira_em) VALUES (?, ?, ?) "
+                "ON CONFLICT (nome) DO UPDATE SET dono = excluded.dono, expira_em = excluded.expira_em "
+                "WHERE leases.dono = excluded.dono OR leases.expira_em < ?",
+                (self.nome, self.dono, agora + self.duracao_segundos, agora)
+            )
+            lider = cursor.rowcount == 1
+
+        if lider != self._lider:
+            logger.info(f"{'Assumiu' if lider else 'Perdeu'} a liderança de '{self.nome}' ({self.dono}).")
+            self._lider = lider
+        return lider
+
+    def liberar(self):
+        """Devolve o lease (ex: ao encerrar o worker), para outro assumir sem esperar o vencimento."""
+        with db.conexao(self.db_name) as conn:
+            conn.execute("DELETE FROM leases WHERE nome = ? AND dono = ?", (self.nome, self.dono))
+        self._lider = False
@@ -0,0 +1,203 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos lotes de parâmetros no DELETE ... IN (...) (o SQLite aceita no máximo 999 em versões antigas)
+TAMANHO_LOTE_DELETE = 500
+# Subdiretórios de `pdf_dir` com os PDFs de um lote ainda em geração (a varredura só olha a raiz)
+PREFIXO_LOTE = '.lote-'
+# Um diretório de lote parado há mais que isso é de um processo que morreu no meio do lote
+LOTE_ABANDONADO_SEGUNDOS = 24 * 60 * 60
+
+
+class LimpezaPDF:
+    """
+    Limpeza dos PDFs gerados em `PDF_DIR` e dos registros em `generated_files`.
+
+    Cada varredura faz as consultas pelo índice de `created_at`, apaga os arquivos
+    fora de qualquer transação e depois remove os registros em uma única transação
+    curta, para não segurar o lock do banco enquanto mexe no disco.
+    Opcionalmente aplica uma cota de disco (removendo primeiro os PDFs acessados há
+    mais tempo) e, a cada `reconciliar_a_cada` varreduras, remove arquivos sem
+    registro e registros sem arquivo.
+
+    Os lotes geram os PDFs em um subdiretório (`lote_em_andamento`), fora do alcance
+    da varredura, e só os publicam na raiz no fim, logo antes de registrá-los: um lote
+    mais longo que `max_idade_minutos` não perde PDFs como órfãos ou pela cota.
+    """
+
+    def __init__(self, db_name, pdf_dir, max_idade_minutos=5, cota_bytes=0, reconciliar_a_cada=10):
+        self.db_name = db_name
+        self.pdf_dir = pdf_dir
+        self.max_idade_minutos = max_idade_minutos
+        self.cota_bytes = cota_bytes
+        self.reconciliar_a_cada = reconciliar_a_cada
+        self._lock = threading.Lock()
+        self._stats = {
+            'varreduras': 0,
+            'ultima_varredura_ms': 0.0,
+            'tempo_total_ms': 0.0,
+            'arquivos_removidos': 0,
+            'bytes_recuperados': 0,
+            'removidos_por_cota': 0,
+            'arquivos_orfaos': 0,
+            'registros_orfaos': 0,
+        }
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_generated_files_created_at ON generated_files (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_generated_files_filename ON generated_files (filename)")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def touch(self, filename):
+        """Marca o PDF como acessado agora (usado na ordem de remoção por cota)."""
+        try:
+            caminho = os.path.join(self.pdf_dir, filename)
+            os.utime(caminho, (time.time(), os.stat(caminho).st_mtime))
+        except OSError:
+            pass
+
+    def _remover_arquivo(self, filename):
+        """Apaga o arquivo do disco e devolve quantos bytes foram liberados."""
+        caminho = os.path.join(self.pdf_dir, filename)
+        try:
+            tamanho = os.stat(caminho).st_size
+            os.remove(caminho)
+            return tamanho
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"Erro ao deletar arquivo físico {filename}: {e}")
+            return 0
+
+    @contextmanager
+    def lote_em_andamento(self):
+        """Diretório (dentro de `pdf_dir`) onde um lote grava os PDFs; apagado ao sair, com o que sobrou."""
+        diretorio = tempfile.mkdtemp(prefix=PREFIXO_LOTE, dir=self.pdf_dir)
+        try:
+            yield diretorio
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def publicar(self, diretorio, filenames):
+        """
+        Move os PDFs prontos do lote para `pdf_dir`, com a data de agora: a carência dos
+        arquivos sem registro conta a partir daqui, até o lote registrá-los.
+        """
+        agora = time.time()
+        for filename in filenames:
+            caminho = os.path.join(self.pdf_dir, filename)
+            os.replace(os.path.join(diretorio, filename), caminho)
+            os.utime(caminho, (agora, agora))
+
+    def _remover_lotes_abandonados(self):
+        limite = time.time() - LOTE_ABANDONADO_SEGUNDOS
+        with os.scandir(self.pdf_dir) as entradas:
+            abandonados = [entrada.path for entrada in entradas
+                           if entrada.is_dir() and entrada.name.startswith(PREFIXO_LOTE)
+                           and entrada.stat().st_mtime < limite]
+        for caminho in abandonados:
+            logger.warning(f"Removendo diretório de lote abandonado: {caminho}")
+            shutil.rmtree(caminho, ignore_errors=True)
+
+    def _arquivos_no_disco(self):
+        """[(filename, tamanho, último acesso, mtime)] dos PDFs em `pdf_dir`."""
+        arquivos = []
+        with os.scandir(self.pdf_dir) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and entrada.name.endswith('.pdf'):
+                    st = entrada.stat()
+                    arquivos.append((entrada.name, st.st_size, st.st_atime, st.st_mtime))
+        return arquivos
+
+    def _expirados(self, conn):
+        """Arquivos com mais de `max_idade_minutos` e o limite usado na consulta (pelo índice de created_at)."""
+        limite = conn.execute("SELECT datetime('now', ?)", (f'-{self.max_idade_minutos} minutes',)).fetchone()[0]
+        filenames = [row[0] for row in conn.execute(
+            "SELECT filename FROM generated_files WHERE created_at <= ?", (limite,))]
+        return filenames, limite
+
+    def _acima_da_cota(self, ignorar):
+        """PDFs a remover, do acesso mais antigo ao mais recente, até o diretório caber na cota."""
+        if not self.cota_bytes:
+            return []
+        arquivos = [a for a in self._arquivos_no_disco() if a[0] not in ignorar]
+        total = sum(tamanho for _, tamanho, _, _ in arquivos)
+        excedentes = []
+        for filename, tamanho, _, _ in sorted(arquivos, key=lambda a: a[2]):
+            if total <= self.cota_bytes:
+                break
+            excedentes.append(filename)
+            total -= tamanho
+        return excedentes
+
+    def _orfaos(self, conn, ignorar):
+        """(arquivos sem registro, registros sem arquivo); `ignorar` são os que a varredura já vai remover."""
+        carencia = time.time() - self.max_idade_minutos * 60
+        # Registros antes do disco: um PDF gravado e registrado no meio da leitura não vira registro órfão
+        registrados = {row[0] for row in conn.execute("SELECT filename FROM generated_files")}
+        no_disco = self._arquivos_no_disco()
+        nomes_no_disco = {a[0] for a in no_disco}
+
+        # O registro só é gravado depois do PDF; a carência evita apagar um arquivo que ainda vai ser registrado
+        arquivos_orfaos = [nome for nome, _, _, mtime in no_disco
+                           if nome not in registrados and nome not in ignorar and mtime < carencia]
+        registros_orfaos = [nome for nome in registrados if nome not in nomes_no_disco and nome not in ignorar]
+        return arquivos_orfaos, registros_orfaos
+
+    def _delete_por_nome(self, conn, filenames):
+        for i in range(0, len(filenames), TAMANHO_LOTE_DELETE):
+            lote = filenames[i:i + TAMANHO_LOTE_DELETE]
+            conn.execute(f"DELETE FROM generated_files WHERE filename IN ({','.join('?' * len(lote))})", lote)
+
+    def sweep(self):
+        """Executa uma varredura completa. Retorna um resumo do que foi removido."""
+        inicio = time.perf_counter()
+        with self._lock:
+            numero = self._stats['varreduras'] + 1
+        reconciliar = bool(self.reconciliar_a_cada) and numero % self.reconciliar_a_cada == 0
+
+        with db.conexao(self.db_name) as conn:
+            expirados, limite = self._expirados(conn)
+            por_cota = self._acima_da_cota(set(expirados))
+            arquivos_orfaos, registros_orfaos = (self._orfaos(conn, set(expirados) | set(por_cota))
+                                                 if reconciliar else ([], []))
+
+            # Primeiro o disco, sem transação aberta: quem grava em generated_files não fica esperando
+            bytes_recuperados = sum(self._remover_arquivo(f) for f in expirados + por_cota + arquivos_orfaos)
+            if reconciliar:
+                self._remover_lotes_abandonados()
+
+            # Depois os registros, em uma única transação
+            with conn:
+                conn.execute("DELETE FROM generated_files WHERE created_at <= ?", (limite,))
+                self._delete_por_nome(conn, por_cota + registros_orfaos)
+
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        resumo = {
+            'arquivos_removidos': len(expirados) + len(por_cota) + len(arquivos_orfaos),
+            'bytes_recuperados': bytes_recuperados,
+            'removidos_por_cota': len(por_cota),
+            'arquivos_orfaos': len(arquivos_orfaos),
+            'registros_orfaos': len(registros_orfaos),
+            'duracao_ms': duracao_ms,
+        }
+        with self._lock:
+            self._stats['varreduras'] += 1
+            self._stats['ultima_varredura_ms'] = duracao_ms
+            self._stats['tempo_total_ms'] += duracao_ms
+            for chave in ('arquivos_removidos', 'bytes_recuperados', 'removidos_por_cota', 'arquivos_orfaos', 'registros_orfaos'):
+                self._stats[chave] += resumo[chave]
+        return resumo
@@ -0,0 +1,109 @@
+import io
+import os
+import re
+import base64
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+
+logger = logging.getLogger(__name__)
+
+# O cabeçalho desenha o logo em 0.7" x 0.7"; 300 dpi é o suficiente para impressão
+LADO_LOGO_PX = int(0.7 * 300)
+FORMATOS_ACEITOS = {'PNG', 'JPEG'}
+
+_RE_LOGO_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class LogoInvalido(ValueError):
+    """O arquivo enviado não é uma imagem PNG/JPEG válida."""
+
+
+class LogoStore:
+    """
+    Logos das oficinas guardados uma única vez, pelo hash do conteúdo enviado.
+    A imagem já é reduzida para o tamanho em que é desenhada no cabeçalho, e os
+    ImageReader prontos ficam em um cache LRU limitado para não reabrir o arquivo a cada página.
+    """
+
+    def __init__(self, diretorio, max_cache=32, lado_px=LADO_LOGO_PX):
+        self.diretorio = diretorio
+        self.max_cache = max_cache
+        self.lado_px = lado_px
+        self._cache = OrderedDict()  # logo_id -> ImageReader
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, logo_id):
+        return os.path.join(self.diretorio, f"{logo_id}.png")
+
+    def is_valid_id(self, logo_id):
+        return bool(logo_id) and bool(_RE_LOGO_ID.match(logo_id))
+
+    def exists(self, logo_id):
+        return self.is_valid_id(logo_id) and os.path.exists(self._caminho(logo_id))
+
+    def save(self, conteudo):
+        """Valida, reduz e grava a imagem (se ainda não existir). Retorna o logo_id."""
+        logo_id = hashlib.sha256(conteudo).hexdigest()[:32]
+        caminho = self._caminho(logo_id)
+        if os.path.exists(caminho):
+            return logo_id
+
+        try:
+            img = PILImage.open(io.BytesIO(conteudo))
+            formato = img.format
+            img.load()
+        except Exception as e:
+            raise LogoInvalido(f"Não foi possível ler a imagem: {e}")
+        if formato not in FORMATOS_ACEITOS:
+            raise LogoInvalido(f"Formato de imagem não suportado: {formato}")
+
+        img.thumbnail((self.lado_px, self.lado_px), PILImage.LANCZOS)
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA')
+
+        # Grava em um temporário e renomeia, para nunca ler um PNG pela metade
+        temp_path = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(temp_path, 'PNG', optimize=True)
+        os.replace(temp_path, caminho)
+        logger.info(f"Logo {logo_id} salvo ({img.width}x{img.height}px).")
+        return logo_id
+
+    def save_data_url(self, data_url):
+        """Compatibilidade com o logo em Base64 (data:image/...;base64,...) das versões anteriores."""
+        if not data_url or not data_url.startswith('data:image/'):
+            raise LogoInvalido("Logo em Base64 inválido.")
+        try:
+            _, img_data_b64 = data_url.split(',', 1)
+            conteudo = base64.b64decode(img_data_b64)
+        except Exception as e:
+            raise LogoInvalido(f"Erro ao decodificar logo Base64: {e}")
+        return self.save(conteudo)
+
+    def get_reader(self, logo_id):
+        """ImageReader pronto para o canvas, ou None se o logo não existir."""
+        if not self.is_valid_id(logo_id):
+            return None
+        with self._lock:
+            reader = self._cache.get(logo_id)
+            if reader is not None:
+                self._cache.move_to_end(logo_id)
+                return reader
+
+        caminho = self._caminho(logo_id)
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, 'rb') as f:
+            reader = ImageReader(io.BytesIO(f.read()))
+
+        with self._lock:
+            self._cache[logo_id] = reader
+            self._cache.move_to_end(logo_id)
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+        return reader
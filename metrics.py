@@ -0,0 +1,188 @@
+"""
+Métricas do servidor no formato texto do Prometheus (GET /metrics).
+
+- Contadores e histogramas alimentados no caminho quente (`contar`, `observar`, `etapa`).
+- `etapa(nome)` mede o tempo de um trecho (chamada à IA, doc.build, SQLite...)
+  no histograma os_bot_etapa_segundos{etapa="..."}.
+- Coletores: funções chamadas a cada leitura de /metrics que devolvem um dict
+  de stats (limpeza, cache de PDFs, admissão...); cada valor numérico vira um gauge,
+  exceto os acumulados desde o início do processo (hits, removidos...), que são
+  exportados como counter com o sufixo _total.
+- Perfil por requisição: com um perfil ativo (`iniciar_perfil`), cada etapa
+  executada no mesmo contexto também é anotada nele, para o cabeçalho
+  Server-Timing ou para o log das requisições lentas.
+
+Sem dependências: o formato de exportação é simples o bastante para ser gerado aqui.
+"""
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PREFIXO = 'os_bot'
+# Limites (em segundos) dos buckets: de SQLite (ms) até chamadas lentas à IA
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_perfil_atual = contextvars.ContextVar('perfil_atual', default=None)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in rotulos) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Perfil:
+    """Etapas de uma única requisição, na ordem em que terminaram."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = []  # (nome, segundos)
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing (durações em ms, etapas repetidas somadas)."""
+        somas = {}
+        for nome, segundos in self.etapas:
+            somas[nome] = somas.get(nome, 0.0) + segundos
+        partes = [f"{nome.replace('.', '_')};dur={segundos * 1000:.1f}" for nome, segundos in somas.items()]
+        partes.append(f"total;dur={self.total() * 1000:.1f}")
+        return ', '.join(partes)
+
+    def texto(self):
+        return ' '.join(f"{nome}={segundos * 1000:.1f}ms" for nome, segundos in self.etapas)
+
+
+class Metricas:
+
+    def __init__(self, prefixo=PREFIXO, buckets=BUCKETS_PADRAO):
+        self.prefixo = prefixo
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._ajuda = {}        # nome -> (tipo, ajuda)
+        self._contadores = {}   # (nome, rótulos) -> valor
+        self._histogramas = {}  # (nome, rótulos) -> [contagens por bucket..., soma, total]
+        self._coletores = []    # (nome, função que devolve um dict de stats, chaves acumuladas)
+
+    def _nome(self, nome):
+        return f"{self.prefixo}_{nome}"
+
+    def descrever(self, nome, tipo, ajuda):
+        self._ajuda[self._nome(nome)] = (tipo, ajuda)
+
+    # --- Caminho quente ---
+
+    def contar(self, nome, valor=1, **rotulos):
+        chave = (self._nome(nome), tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = (self._nome(nome), tuple(sorted(rotulos.items())))
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._histogramas.get(chave)
+            if serie is None:
+                serie = self._histogramas[chave] = [0] * (len(self.buckets) + 2)
+            if indice < len(self.buckets):
+                serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco no histograma etapa_segundos e no perfil da requisição, se houver."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            self.observar('etapa_segundos', duracao, etapa=nome)
+            perfil = _perfil_atual.get()
+            if perfil is not None:
+                perfil.etapas.append((nome, duracao))
+
+    # --- Perfil por requisição ---
+
+    def iniciar_perfil(self):
+        """Ativa um perfil novo no contexto atual (thread ou tarefa do asyncio) e o devolve."""
+        perfil = Perfil()
+        _perfil_atual.set(perfil)
+        return perfil
+
+    def encerrar_perfil(self):
+        _perfil_atual.set(None)
+
+    # --- Exportação ---
+
+    def registrar_coletor(self, nome, funcao, contadores=()):
+        """
+        `funcao()` devolve um dict; cada valor numérico vira o gauge <prefixo>_<nome>_<chave>.
+        As chaves em `contadores` só crescem e viram o counter <prefixo>_<nome>_<chave>_total.
+        """
+        self._coletores.append((nome, funcao, frozenset(contadores)))
+
+    def exportar(self):
+        """Todas as métricas no formato texto do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {chave: list(serie) for chave, serie in self._histogramas.items()}
+
+        linhas = []
+        vistos = set()
+
+        def cabecalho(nome, tipo_padrao):
+            if nome in vistos:
+                return
+            vistos.add(nome)
+            tipo, ajuda = self._ajuda.get(nome, (tipo_padrao, ''))
+            if ajuda:
+                linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        for (nome, rotulos), valor in sorted(contadores.items()):
+            cabecalho(nome, 'counter')
+            linhas.append(f"{nome}{_rotulos(rotulos)} {_numero(valor)}")
+
+        for (nome, rotulos), serie in sorted(histogramas.items()):
+            cabecalho(nome, 'histogram')
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), serie[:-2] + [serie[-1] - sum(serie[:-2])]):
+                acumulado += contagem
+                linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', _numero(float(limite))),))} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(rotulos)} {_numero(serie[-2])}")
+            linhas.append(f"{nome}_count{_rotulos(rotulos)} {serie[-1]}")
+
+        for prefixo, funcao, acumulados in self._coletores:
+            try:
+                stats = funcao()
+            except Exception as e:
+                linhas.append(f"# coletor {prefixo} falhou: {e}")
+                continue
+            for chave, valor in sorted(stats.items()):
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    continue
+                if chave in acumulados:
+                    nome = self._nome(f"{prefixo}_{chave}_total")
+                    cabecalho(nome, 'counter')
+                else:
+                    nome = self._nome(f"{prefixo}_{chave}")
+                    cabecalho(nome, 'gauge')
+                linhas.append(f"{nome} {_numero(valor)}")
+
+        return '\n'.join(linhas) + '\n'
@@ -0,0 +1,85 @@
+import re
+import json
+import time
+import secrets
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Campos do objeto 'oficina' guardados no perfil (o logo fica à parte, pelo logo_id)
+CAMPOS_OFICINA = ('nome', 'cnpj', 'endereco', 'cidade_estado', 'telefone')
+MAX_TOKEN = 200
+
+
+def normalizar_cnpj(cnpj):
+    return re.sub(r'\D', '', cnpj or '')
+
+
+class OficinaStore:
+    """
+    Perfis das oficinas: os dados do Bloco 5 e a referência ao logo, para não
+    perguntá-los de novo a cada OS. Cada perfil é indexado pelo CNPJ (só dígitos);
+    os tokens (de login ou emitidos aqui na primeira OS) apontam para um CNPJ.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS oficinas (
+                cnpj TEXT PRIMARY KEY,
+                dados TEXT NOT NULL,
+                logo_id TEXT,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS oficina_tokens (
+                token TEXT PRIMARY KEY,
+                cnpj TEXT NOT NULL
+            )
+            ''')
+
+    def get(self, token):
+        """{'dados', 'logo_id'} da oficina do `token`, ou None."""
+        if not token or not isinstance(token, str) or len(token) > MAX_TOKEN:
+            return None
+        with db.conexao(self.db_name) as conn:
+            row = conn.execute(
+                "SELECT o.dados, o.logo_id FROM oficina_tokens t JOIN oficinas o ON o.cnpj = t.cnpj WHERE t.token = ?",
+                (token,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'dados': json.loads(row[0]), 'logo_id': row[1]}
+
+    def save(self, oficina, logo_id=None, token=None):
+        """
+        Grava (ou atualiza) o perfil pelo CNPJ e associa o `token` a ele, criando um
+        token novo se não vier nenhum. Retorna o token, ou None se a oficina não tem CNPJ.
+        """
+        cnpj = normalizar_cnpj(oficina.get('cnpj'))
+        if not cnpj:
+            return None
+        if not token or not isinstance(token, str) or len(token) > MAX_TOKEN:
+            token = secrets.token_urlsafe(24)
+        dados = {campo: oficina.get(campo, '') for campo in CAMPOS_OFICINA}
+
+        with db.conexao(self.db_name) as conn:
+            conn.execute(
+                "INSERT INTO oficinas (cnpj, dados, logo_id, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (cnpj) DO UPDATE SET dados = excluded.dados, logo_id = excluded.logo_id, "
+                "updated_at = excluded.updated_at",
+                (cnpj, json.dumps(dados, ensure_ascii=False), logo_id, time.time())
+            )
+            conn.execute(
+                "INSERT INTO oficina_tokens (token, cnpj) VALUES (?, ?) "
+                "ON CONFLICT (token) DO UPDATE SET cnpj = excluded.cnpj",
+                (token, cnpj)
+            )
+        logger.info(f"Perfil da oficina {cnpj} salvo.")
+        return token
@@ -0,0 +1,119 @@
+import json
+import hashlib
+import logging
+
+import db
+import render_context
+
+logger = logging.getLogger(__name__)
+
+
+def hash_dos_dados(dados_os):
+    """Hash do conteúdo da OS + versão do layout: dois pedidos iguais geram o mesmo PDF."""
+    conteudo = json.dumps(dados_os, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{render_context.VERSAO_LAYOUT}:{conteudo}".encode('utf-8')).hexdigest()[:32]
+
+
+class OrdemStore:
+    """
+    Ordens de Serviço finalizadas, guardadas como JSON na tabela `ordens`.
+    O PDF não é mais a fonte da verdade: ele pode ser gerado de novo a partir
+    destes dados sempre que for baixado.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS ordens (
+                numero_os TEXT PRIMARY KEY,
+                filename TEXT NOT NULL UNIQUE,
+                dados TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+
+    def _proximo_sufixo(self, conn, base):
+        """Maior sufixo já usado para `base` (OS250101-1030, OS250101-1030-2, ...) mais um."""
+        maior = 1
+        # Intervalo em vez de LIKE para usar o índice da chave primária ('.' vem logo depois de '-')
+        for (numero,) in conn.execute(
+                "SELECT numero_os FROM ordens WHERE numero_os > ? AND numero_os < ?", (base + '-', base + '.')):
+            sufixo = numero[len(base) + 1:]
+            if sufixo.isdigit():
+                maior = max(maior, int(sufixo))
+        return maior + 1
+
+    def save_many(self, ordens, nome_do_arquivo):
+        """
+        Grava as ordens [(dados_os, numero_unico), ...] em uma única transação e devolve os nomes de arquivo.
+
+        Com `numero_unico`, o `numero_os` gerado pelo app (um por minuto) ganha um sufixo
+        se já existir; sem ele, o número veio de fora (reimpressão) e a ordem é atualizada,
+        mantendo o nome de arquivo que já tinha.
+        """
+        filenames = []
+        proximo = {}  # base do número -> próximo sufixo livre, para não consultar o banco a cada ordem
+        with db.conexao(self.db_name) as conn:
+            with conn:
+                # IMMEDIATE reserva a escrita já na consulta dos sufixos: dois workers
+                # (ou threads) não escolhem o mesmo número entre o SELECT e o INSERT
+                conn.execute("BEGIN IMMEDIATE")
+                for dados_os, numero_unico in ordens:
+                    base = dados_os['numero_os']
+                    if numero_unico:
+                        existe = base in proximo or conn.execute(
+                            "SELECT 1 FROM ordens WHERE numero_os = ?", (base,)).fetchone()
+                        if existe:
+                            if base not in proximo:
+                                proximo[base] = self._proximo_sufixo(conn, base)
+                            dados_os['numero_os'] = f"{base}-{proximo[base]}"
+                            proximo[base] += 1
+                        else:
+                            proximo[base] = 2
+                    else:
+                        row = conn.execute("SELECT filename FROM ordens WHERE numero_os = ?", (base,)).fetchone()
+                        if row:
+                            conn.execute("UPDATE ordens SET dados = ?, hash = ? WHERE numero_os = ?",
+                                         (json.dumps(dados_os, ensure_ascii=False), hash_dos_dados(dados_os), base))
+                            filenames.append(row[0])
+                            continue
+
+                    filename = nome_do_arquivo(dados_os)
+                    conn.execute(
+                        "INSERT INTO ordens (numero_os, filename, dados, hash) VALUES (?, ?, ?, ?)",
+                        (dados_os['numero_os'], filename, json.dumps(dados_os, ensure_ascii=False), hash_dos_dados(dados_os))
+                    )
+                    filenames.append(filename)
+        return filenames
+
+    def save(self, dados_os, nome_do_arquivo, numero_unico=True):
+        filename = self.save_many([(dados_os, numero_unico)], nome_do_arquivo)[0]
+        logger.info(f"OS {dados_os['numero_os']} registrada ({filename}).")
+        return filename
+
+    def get_by_filename(self, filename):
+        """{'numero_os', 'dados', 'hash'} da ordem baixada por `filename`, ou None."""
+        with db.conexao(self.db_name) as conn:
+            row = conn.execute("SELECT numero_os, dados, hash FROM ordens WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        dados = json.loads(row[1])
+        # Recalculado com a VERSAO_LAYOUT atual: ordens gravadas antes de uma mudança de layout são renderizadas de novo
+        return {'numero_os': row[0], 'dados': dados, 'hash': hash_dos_dados(dados)}
+
+    def iterar_dados(self, tamanho_pagina=1000):
+        """Dados de todas as ordens, em páginas pela chave primária (sem manter um cursor aberto entre as páginas)."""
+        ultimo = ''
+        while True:
+            with db.conexao(self.db_name) as conn:
+                pagina = conn.execute("SELECT numero_os, dados FROM ordens WHERE numero_os > ? ORDER BY numero_os LIMIT ?",
+                                      (ultimo, tamanho_pagina)).fetchall()
+            for _, dados in pagina:
+                yield json.loads(dados)
+            if len(pagina) < tamanho_pagina:
+                return
+            ultimo = pagina[-1][0]
@@ -0,0 +1,104 @@
+import io
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PDFStore:
+    """
+    Cache em memória dos PDFs renderizados, indexado pelo hash do conteúdo da OS.
+    Mesmo uso do RenderCache, mas o SimpleDocTemplate escreve em um buffer e nada
+    vai para o disco: get() devolve os bytes do PDF em vez de um caminho.
+
+    Limitado em bytes (sai primeiro o PDF baixado há mais tempo) e por idade:
+    um PDF fica no máximo `ttl_segundos` depois de renderizado. Dois downloads
+    simultâneos da mesma OS esperam pela mesma renderização.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_segundos=900):
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._renderizando = {}  # chave -> [Lock da renderização, requisições usando o lock]
+        self._itens = OrderedDict()  # chave -> (bytes, expira_em), do acesso mais antigo ao mais recente
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'removidos': 0, 'expirados': 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, arquivos=len(self._itens), bytes=self._bytes)
+
+    def _remover(self, chave):
+        conteudo, _ = self._itens.pop(chave)
+        self._bytes -= len(conteudo)
+
+    def _hit(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                self._remover(chave)
+                self._stats['expirados'] += 1
+                return None
+            self._itens.move_to_end(chave)
+            self._stats['hits'] += 1
+            return item[0]
+
+    def get(self, chave, renderizar):
+        """Bytes do PDF de `chave`; chama renderizar(buffer) se ainda não estiver em memória."""
+        conteudo = self._hit(chave)
+        if conteudo is not None:
+            return conteudo
+
+        with self._lock:
+            entrada = self._renderizando.setdefault(chave, [threading.Lock(), 0])
+            entrada[1] += 1
+            trava = entrada[0]
+        try:
+            with trava:
+                # Outra requisição pode ter renderizado enquanto esta esperava
+                conteudo = self._hit(chave)
+                if conteudo is not None:
+                    return conteudo
+                buffer = io.BytesIO()
+                renderizar(buffer)
+                conteudo = buffer.getvalue()
+                with self._lock:
+                    self._stats['misses'] += 1
+                    self._guardar(chave, conteudo)
+        finally:
+            with self._lock:
+                # Só a última requisição solta o lock: enquanto alguém espera nele, nenhuma
+                # requisição nova cria outro lock para a mesma chave (e outra renderização)
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._renderizando[chave]
+        return conteudo
+
+    def _guardar(self, chave, conteudo):
+        """Guarda o PDF e aplica os limites (com o lock já adquirido)."""
+        if len(conteudo) > self.max_bytes:
+            # Maior que o cache inteiro: é servido, mas não guardado
+            return
+        agora = time.monotonic()
+        if chave in self._itens:
+            self._remover(chave)
+        self._itens[chave] = (conteudo, agora + self.ttl_segundos)
+        self._bytes += len(conteudo)
+
+        expirados = [c for c, (_, expira_em) in self._itens.items() if expira_em <= agora]
+        for c in expirados:
+            self._remover(c)
+        self._stats['expirados'] += len(expirados)
+
+        removidos = 0
+        while self._bytes > self.max_bytes:
+            self._remover(next(iter(self._itens)))
+            removidos += 1
+        self._stats['removidos'] += removidos
+        if removidos:
+            logger.info(f"{removidos} PDFs removidos da memória.")
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Um .tmp mais velho que isso é de uma renderização que não vai mais terminar, mesmo que o pid exista
+TEMP_MAX_IDADE_SEGUNDOS = 10 * 60
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _temp_abandonado(entrada, agora):
+    """
+    O .tmp ({chave}.pdf.{pid}.{thread}.tmp) é de uma renderização interrompida?
+    Outros workers (e os processos do lote, que importam o app) usam o mesmo diretório:
+    só sai o arquivo de um processo que já morreu ou velho demais para estar em andamento.
+    """
+    try:
+        pid = int(entrada.name.split('.')[-3])
+    except (IndexError, ValueError):
+        pid = None
+    if pid is not None and not _processo_vivo(pid):
+        return True
+    try:
+        return agora - entrada.stat().st_mtime > TEMP_MAX_IDADE_SEGUNDOS
+    except FileNotFoundError:
+        return False
+
+
+class RenderCache:
+    """
+    Cache em disco dos PDFs renderizados, indexado pelo hash do conteúdo da OS.
+    Limitado em bytes e em quantidade de arquivos; ao passar de um dos limites,
+    sai primeiro o PDF baixado há mais tempo. Dois downloads simultâneos da mesma
+    OS esperam pela mesma renderização em vez de gerar o PDF duas vezes.
+    """
+
+    def __init__(self, diretorio, max_bytes=200 * 1024 * 1024, max_arquivos=2000):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.max_arquivos = max_arquivos
+        self._lock = threading.Lock()
+        self._renderizando = {}  # chave -> [Lock da renderização, requisições usando o lock]
+        self._stats = {'hits': 0, 'misses': 0, 'removidos': 0}
+        os.makedirs(diretorio, exist_ok=True)
+        self._indice = self._carregar_indice()  # chave -> tamanho, do acesso mais antigo ao mais recente
+
+    def _carregar_indice(self):
+        arquivos = []
+        agora = time.time()
+        with os.scandir(self.diretorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and entrada.name.endswith('.pdf'):
+                    st = entrada.stat()
+                    arquivos.append((st.st_atime, entrada.name[:-4], st.st_size))
+                elif entrada.name.endswith('.tmp') and _temp_abandonado(entrada, agora):
+                    # Renderização interrompida por um restart
+                    try:
+                        os.remove(entrada.path)
+                    except FileNotFoundError:
+                        pass
+        return OrderedDict((chave, tamanho) for _, chave, tamanho in sorted(arquivos))
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.pdf")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, arquivos=len(self._indice), bytes=sum(self._indice.values()))
+
+    def _hit(self, chave):
+        with self._lock:
+            if chave not in self._indice or not os.path.exists(self._caminho(chave)):
+                return False
+            self._indice.move_to_end(chave)
+            self._stats['hits'] += 1
+            return True
+
+    def get(self, chave, renderizar):
+        """Caminho do PDF de `chave`; chama renderizar(caminho_destino) se ainda não estiver em cache."""
+        caminho = self._caminho(chave)
+        if self._hit(chave):
+            return caminho
+
+        with self._lock:
+            entrada = self._renderizando.setdefault(chave, [threading.Lock(), 0])
+            entrada[1] += 1
+            trava = entrada[0]
+        try:
+            with trava:
+                # Outra requisição pode ter renderizado enquanto esta esperava
+                if self._hit(chave):
+                    return caminho
+                temp_path = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    renderizar(temp_path)
+                    os.replace(temp_path, caminho)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                with self._lock:
+                    self._indice[chave] = os.path.getsize(caminho)
+                    self._stats['misses'] += 1
+        finally:
+            with self._lock:
+                # Só a última requisição solta o lock: enquanto alguém espera nele, nenhuma
+                # requisição nova cria outro lock para a mesma chave (e outra renderização)
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._renderizando[chave]
+
+        self._aplicar_limites(manter=chave)
+        return caminho
+
+    def _aplicar_limites(self, manter):
+        with self._lock:
+            total = sum(self._indice.values())
+            removidos = []
+            while self._indice and (len(self._indice) > self.max_arquivos or total > self.max_bytes):
+                chave = next(iter(self._indice))
+                if chave == manter:
+                    break
+                total -= self._indice.pop(chave)
+                removidos.append(chave)
+            self._stats['removidos'] += len(removidos)
+
+        for chave in removidos:
+            try:
+                os.remove(self._caminho(chave))
+            except FileNotFoundError:
+                pass
+        if removidos:
+            logger.info(f"{len(removidos)} PDFs removidos do cache de renderização.")
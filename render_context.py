@@ -0,0 +1,131 @@
+"""
+Contexto de renderização dos PDFs de OS.
+
+Estilos de parágrafo, estilos de tabela e as peças fixas do cabeçalho são
+montados uma única vez, na importação, e reaproveitados por todos os documentos
+(inclusive por threads diferentes da fila de PDFs). Só ficam aqui objetos que o
+ReportLab não altera durante o build: Paragraph e Table guardam estado de layout
+e continuam sendo criados a cada documento.
+"""
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import Paragraph, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib import colors
+
+# Entra no hash das OS guardadas: mude ao alterar o layout para que os PDFs em cache sejam refeitos
+VERSAO_LAYOUT = 2
+
+# --- Página ---
+PAGESIZE = A4
+MARGENS = {'leftMargin': 40, 'rightMargin': 40, 'topMargin': 100, 'bottomMargin': 40}
+LARGURA_UTIL = PAGESIZE[0] - MARGENS['leftMargin'] - MARGENS['rightMargin']
+TAMANHO_LOGO = 0.7 * 72
+
+
+def _criar_estilos():
+    styles = getSampleStyleSheet()
+
+    # Corpo da OS
+    styles.add(ParagraphStyle(name='TitleOS', parent=styles['h1'], fontSize=18, alignment=TA_CENTER, spaceAfter=10, textColor=colors.HexColor('#003366')))
+    styles.add(ParagraphStyle(name='SectionHeading', parent=styles['h2'], fontSize=12, spaceBefore=10, spaceAfter=5, textColor=colors.HexColor('#333333')))
+    styles.add(ParagraphStyle(name='FieldValue', parent=styles['Normal'], fontSize=10, spaceAfter=3))
+    styles.add(ParagraphStyle(name='FieldLabel', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#666666')))
+    styles.add(ParagraphStyle(name='TableHeading', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=colors.whitesmoke))
+    styles.add(ParagraphStyle(name='TableData', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='TableTotalLabel', parent=styles['h3'], fontSize=11, alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='TableTotalValue', parent=styles['h3'], fontSize=11, alignment=TA_CENTER, textColor=colors.red))
+
+    # Cabeçalho (antes recriados a cada página)
+    styles.add(ParagraphStyle(name='HeaderTitle', parent=styles['Heading1'], fontSize=16, alignment=TA_CENTER, spaceAfter=4))
+    styles.add(ParagraphStyle(name='HeaderAddress', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, leading=10))
+    return styles
+
+
+styles = _criar_estilos()
+
+# --- Estilos de Tabela ---
+TABELA_INFO_OS = TableStyle([
+    ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 4),
+])
+
+# Dados do cliente e do veículo
+TABELA_DADOS = TableStyle([
+    ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 4),
+])
+
+TABELA_SERVICOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003366')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#DDDDDD')),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+    ('TOPPADDING', (0,0), (-1,-1), 3),
+])
+LARGURAS_SERVICOS = [0.5*72, 3.0*72, 2.0*72, 1.5*72]
+
+# OS grandes (frotas): a partir deste número de itens a tabela de serviços usa texto
+# simples nas células e é paginada com subtotais (tabela_servicos.py)
+ITENS_OS_GRANDE = 40
+FONTE_TABELA, FONTE_TABELA_NEGRITO = 'Helvetica', 'Helvetica-Bold'
+TAMANHO_FONTE_TABELA, ENTRELINHA_TABELA = 9, 12
+TABELA_SERVICOS_GRANDE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), FONTE_TABELA),
+    ('FONTSIZE', (0, 0), (-1, -1), TAMANHO_FONTE_TABELA),
+    ('LEADING', (0, 0), (-1, -1), ENTRELINHA_TABELA),
+    ('FONTNAME', (0, 0), (-1, 0), FONTE_TABELA_NEGRITO),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003366')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#DDDDDD')),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+    ('TOPPADDING', (0,0), (-1,-1), 3),
+])
+# Linhas de subtotal (transportado / subtotal da página / a transportar)
+COR_SUBTOTAL = colors.HexColor('#E0F2F7')
+
+TABELA_TOTAL = TableStyle([
+    ('ALIGN', (1, 0), (2, 0), 'RIGHT'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('GRID', (1, 0), (2, 0), 1, colors.HexColor('#003366')),
+    ('BACKGROUND', (1, 0), (2, 0), colors.HexColor('#E0F2F7')),
+])
+LARGURAS_TOTAL = [4.0*72, 2.0*72, 1.5*72]
+
+TABELA_ASSINATURAS = TableStyle([
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'BOTTOM'),
+    ('TOPPADDING', (0,0), (-1,-1), 15),
+])
+
+LARGURAS_DUAS_COLUNAS = [LARGURA_UTIL / 2.0] * 2
+
+
+class Cabecalho:
+    """
+    Parágrafos do cabeçalho de uma OS. Montados e quebrados em linhas uma vez
+    por documento; o callback de página só precisa desenhá-los.
+    """
+
+    def __init__(self, oficina_info):
+        nome_oficina = oficina_info.get('nome', 'NOME DA OFICINA')
+        cnpj_oficina = oficina_info.get('cnpj', 'CNPJ NÃO INFORMADO')
+        endereco_oficina = oficina_info.get('endereco', 'Endereço não informado')
+        cidade_estado = oficina_info.get('cidade_estado', endereco_oficina)
+        telefone_oficina = oficina_info.get('telefone', 'Telefone não informado')
+
+        self.titulo = Paragraph(f"<b>{nome_oficina}</b>", styles['HeaderTitle'])
+        self.endereco = Paragraph(f"{cidade_estado}<br/>CNPJ: {cnpj_oficina} | Tel: {telefone_oficina}", styles['HeaderAddress'])
+        self._largura = None
+
+    def wrap(self, canvas, largura):
+        if self._largura != largura:
+            self.titulo.wrapOn(canvas, largura, 50)
+            self.endereco.wrapOn(canvas, largura, 50)
+            self._largura = largura
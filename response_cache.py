@@ -0,0 +1,64 @@
+import json
+import time
+import hashlib
+import threading
+from itertools import islice
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Cache em memória das respostas da IA, indexado pelo hash do estado canônico do
+    turno (passo do roteiro + resposta normalizada do usuário, ver app.estado_canonico)
+    e de uma `versao` que identifica modelo, SYSTEM_PROMPT e parâmetros da chamada:
+    quando qualquer um deles muda, as chaves mudam e as respostas antigas
+    simplesmente deixam de ser encontradas até saírem do cache.
+
+    Despejo por LRU (max_itens) e por idade (ttl_segundos). Entradas fixas
+    (ex: a saudação) não expiram nem são despejadas.
+    """
+
+    def __init__(self, max_itens=1000, ttl_segundos=3600):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()  # chave -> (conteúdo, expira_em ou None), do uso mais antigo ao mais recente
+        self._stats = {'hits': 0, 'misses': 0, 'expirados': 0, 'removidos': 0}
+
+    @staticmethod
+    def chave(versao, estado):
+        """Hash de (versão, estado); `estado` é qualquer valor serializável em JSON."""
+        bruto = json.dumps([versao, estado], ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[1] is not None and item[1] <= time.monotonic():
+                del self._itens[chave]
+                self._stats['expirados'] += 1
+                item = None
+            if item is None:
+                self._stats['misses'] += 1
+                return None
+            self._itens.move_to_end(chave)
+            self._stats['hits'] += 1
+            return item[0]
+
+    def put(self, chave, conteudo, fixo=False):
+        if not self.max_itens:
+            return
+        expira_em = None if fixo else time.monotonic() + self.ttl_segundos
+        with self._lock:
+            self._itens[chave] = (conteudo, expira_em)
+            self._itens.move_to_end(chave)
+            excedente = len(self._itens) - self.max_itens
+            if excedente > 0:
+                antigas = list(islice((c for c, (_, expira) in self._itens.items() if expira is not None), excedente))
+                for antiga in antigas:
+                    del self._itens[antiga]
+                self._stats['removidos'] += len(antigas)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, itens=len(self._itens))
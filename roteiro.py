@@ -0,0 +1,587 @@
+"""
+Máquina de estados do roteiro de OS (Blocos 1-8 do SYSTEM_PROMPT).
+
+Os turnos mecânicos do roteiro (pular com 'p', respostas s/n, 'sim' no Bloco 7,
+nomes, telefones...) são respondidos localmente, preenchendo os campos do JSON
+da OS diretamente. A IA só é chamada para interpretar texto livre que não dá
+para separar localmente, como a linha de serviço "Pintura capô, 500, Leo".
+
+O estado é um dict serializável em JSON:
+    {"pergunta": <id da pergunta aguardando resposta>,
+     "corrigindo": <True quando veio do Bloco 7>,
+     "dados": <estrutura JSON final da OS>,
+     "servico_atual": <serviço sendo montado no Bloco 3>,
+     "cadastro": <cliente/veículo encontrado pela placa, aguardando confirmação>}
+"""
+import re
+import copy
+import unicodedata
+
+SAUDACAO = ("Olá! 🏁 Vamos iniciar uma nova Ordem de Serviço. Para pular qualquer etapa, digite `p` ou `pular`. "
+            "Cliente que já voltou à oficina? Informe a placa do veículo no lugar do nome.")
+
+TEXTOS = {
+    # Bloco 1: Cliente
+    'cliente_nome': "Qual o nome do cliente? 📝",
+    'cliente_telefone': "Qual o telefone dele? (ou 'p' para pular)",
+    'cliente_endereco': "Qual o endereço? (ou 'p' para pular)",
+    'cliente_documento': "Qual o CPF/CNPJ do cliente? (ou 'p' para pular)",
+    # Bloco 2: Veículo
+    'veiculo_placa': "Certo. Agora os dados do veículo. 🔧 Qual a placa? (ou 'p' para pular)",
+    'veiculo_modelo': "Qual a marca e modelo? (Ex: Fiat Palio) (ou 'p' para pular)",
+    'veiculo_ano': "E qual o ano do veículo? (ou 'p' para pular)",
+    'cadastro_confirmacao': "Usar estes dados do cliente e do veículo? (s/n)",
+    # Bloco 3: Serviços
+    'servico': "Perfeito. Qual seria o serviço / peça trocada no veículo e seu preço? (Ex: Pintura capô, 500, Leo) (ou 'p' para não adicionar serviços)",
+    'servico_descricao': "Qual a descrição?",
+    'servico_valor': "Qual o valor?",
+    'servico_responsavel': "Qual o responsável pelo serviço? (ou 'p' para pular)",
+    'servico_mais': "Serviço adicionado. Gostaria de adicionar mais algum serviço / produto na OS? (s/n)",
+    # Bloco 4: Observações
+    'obs_quer': "Gostaria de adicionar alguma observação? (s/n)",
+    'obs_texto': "Qual a observação? (ou 'p' para pular)",
+    # Bloco 5: Oficina
+    'oficina_nome': "Estamos finalizando. Qual o nome da sua oficina? 🔧 (ou 'p' para pular)",
+    'oficina_cnpj': "Qual o CNPJ da oficina? (ou 'p' para pular)",
+    'oficina_endereco': "Qual o endereço da sua oficina? (Ex: Rua X, 10 - Bairro, Cidade - RJ) (ou 'p' para pular)",
+    'oficina_telefone': "Qual o telefone da sua oficina? (ou 'p' para pular)",
+    'oficina_logo': "Você tem um arquivo de logo para carregar? O upload aparecerá no chat. (ou 'p' para pular)",
+    # Bloco 7: Correção
+    'confirmacao': "Os dados estão corretos? Digite 'sim' (ou 's') para gerar o PDF, ou o que deseja corrigir (ex: 'oficina', 'cliente', 'veiculo', 'servicos', 'obs'). 🔧",
+}
+
+TEXTO_PROXIMO_SERVICO = "Ok. Qual o próximo serviço / produto na OS?"
+FINALIZADO = 'finalizado'
+
+BLOCO_DA_PERGUNTA = {
+    'cliente_nome': 1, 'cliente_telefone': 1, 'cliente_endereco': 1, 'cliente_documento': 1, 'cadastro_confirmacao': 1,
+    'veiculo_placa': 2, 'veiculo_modelo': 2, 'veiculo_ano': 2,
+    'servico': 3, 'servico_descricao': 3, 'servico_valor': 3, 'servico_responsavel': 3, 'servico_mais': 3,
+    'obs_quer': 4, 'obs_texto': 4,
+    'oficina_nome': 5, 'oficina_cnpj': 5, 'oficina_endereco': 5, 'oficina_telefone': 5, 'oficina_logo': 5,
+    'confirmacao': 7,
+}
+
+# Primeira pergunta de cada bloco
+INICIO_DO_BLOCO = {1: 'cliente_nome', 2: 'veiculo_placa', 3: 'servico', 4: 'obs_quer', 5: 'oficina_nome'}
+
+# Perguntas de texto simples: (seção do JSON, campo, próxima pergunta ou None = fim do bloco)
+CAMPOS_SIMPLES = {
+    'cliente_nome': ('cliente', 'nome', 'cliente_telefone'),
+    'cliente_telefone': ('cliente', 'telefone', 'cliente_endereco'),
+    'cliente_endereco': ('cliente', 'endereco', 'cliente_documento'),
+    'cliente_documento': ('cliente', 'documento', None),
+    'veiculo_placa': ('veiculo', 'placa', 'veiculo_modelo'),
+    'veiculo_ano': ('veiculo', 'ano', None),
+    'oficina_nome': ('oficina', 'nome', 'oficina_cnpj'),
+    'oficina_cnpj': ('oficina', 'cnpj', 'oficina_endereco'),
+    'oficina_telefone': ('oficina', 'telefone', 'oficina_logo'),
+}
+
+# Palavras aceitas no Bloco 7: (palavra-chave, bloco a corrigir, resposta)
+CORRECOES = [
+    ('cliente', 1, "Ok, vamos corrigir o cliente."),
+    ('veiculo', 2, "Ok, vamos corrigir o veículo."),
+    ('servico', 3, "Ok, vamos corrigir os serviços."),
+    ('obs', 4, "Ok, vamos corrigir as observações."),
+    ('oficina', 5, "Ok, vamos corrigir os dados da oficina."),
+]
+
+PULAR = {'p', 'pular'}
+SIM = {'s', 'sim'}
+NAO = {'n', 'nao'}
+
+DADOS_VAZIOS = {
+    "oficina": {"nome": "", "cnpj": "", "endereco": "", "cidade_estado": "", "telefone": "", "logo_data_base64": ""},
+    "cliente": {"nome": "", "telefone": "", "documento": "", "endereco": ""},
+    "veiculo": {"marca": "", "modelo": "", "ano": "", "placa": ""},
+    "servicos": [],
+    "observacoes": ""
+}
+
+# "Pintura capô, 500, Leo" / "Pintura capô, R$ 1.200,50" -> descrição, valor e responsável opcional
+_RE_SERVICO = re.compile(
+    r'^(?P<descricao>.+?)\s*,\s*(?:R\$\s*)?(?P<valor>\d[\d.]*(?:,\d{1,2})?)\s*(?:,\s*(?P<responsavel>.*))?$'
+)
+_RE_VALOR = re.compile(r'^(?:R\$\s*)?(\d[\d.]*(?:,\d{1,2})?|\d+(?:\.\d{1,2})?)$')
+# Placa antiga (ABC1234) ou Mercosul (ABC1D23), já normalizada
+_RE_PLACA = re.compile(r'^[A-Z]{3}[0-9][A-Z0-9][0-9]{2}$')
+# CPF ou CNPJ, com ou sem pontuação
+_RE_DOCUMENTO = re.compile(r'^[\d.\-/\s]+$')
+
+
+# Trechos que identificam as perguntas do roteiro em mensagens escritas pela IA
+# (já normalizados; os mais específicos vêm antes)
+TRECHOS_DAS_PERGUNTAS = [
+    ('usar estes dados do', 'cadastro_confirmacao'),
+    ('resumo da os', 'confirmacao'),
+    ('os dados estao corretos', 'confirmacao'),
+    ('nome da sua oficina', 'oficina_nome'),
+    ('cnpj da oficina', 'oficina_cnpj'),
+    ('endereco da sua oficina', 'oficina_endereco'),
+    ('telefone da sua oficina', 'oficina_telefone'),
+    ('arquivo de logo', 'oficina_logo'),
+    ('nome do cliente', 'cliente_nome'),
+    ('telefone dele', 'cliente_telefone'),
+    ('cpf/cnpj do cliente', 'cliente_documento'),
+    ('qual o endereco', 'cliente_endereco'),
+    ('qual a placa', 'veiculo_placa'),
+    ('marca e modelo', 'veiculo_modelo'),
+    ('ano do veiculo', 'veiculo_ano'),
+    ('adicionar mais algum servico', 'servico_mais'),
+    ('responsavel pelo servico', 'servico_responsavel'),
+    ('proximo servico', 'servico'),
+    ('servico / peca', 'servico'),
+    ('qual a descricao', 'servico_descricao'),
+    ('qual o valor', 'servico_valor'),
+    ('alguma observacao', 'obs_quer'),
+    ('qual a observacao', 'obs_texto'),
+]
+
+PERGUNTAS_DO_SERVICO_ATUAL = ('servico_descricao', 'servico_valor', 'servico_responsavel')
+# Perguntas que aceitam a placa (ou, na primeira, o CPF/CNPJ) de um cliente já cadastrado
+PERGUNTAS_DO_CADASTRO = ('cliente_nome', 'veiculo_placa')
+
+
+class EstadoInvalido(ValueError):
+    """O estado recebido não corresponde a nenhuma etapa do roteiro."""
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.strip().lower().rstrip('.!')
+
+
+def parse_valor(texto):
+    """Converte '500', '1.200,50', 'R$ 99,90' ou '1200.50' em float. Retorna None se não for um valor."""
+    texto = (texto or '').strip()
+    m = _RE_VALOR.match(texto)
+    if not m:
+        return None
+    numero = m.group(1)
+    if ',' in numero:
+        numero = numero.replace('.', '').replace(',', '.')
+    elif numero.count('.') > 1 or re.search(r'\.\d{3}$', numero):
+        # '1.200' é milhar, não decimal
+        numero = numero.replace('.', '')
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+
+def parse_servico(texto):
+    """Separa a linha de serviço localmente. Retorna None quando o formato não é reconhecido."""
+    m = _RE_SERVICO.match((texto or '').strip())
+    if not m:
+        return None
+    valor = parse_valor(m.group('valor'))
+    if valor is None:
+        return None
+    return {
+        'descricao': m.group('descricao').strip(),
+        'valor': valor,
+        'responsavel': (m.group('responsavel') or '').strip(),
+    }
+
+
+def precisa_interpretar_servico(estado, mensagem):
+    """True quando processar() vai chamar interpretar_servico para esta mensagem."""
+    texto = (mensagem or '').strip()
+    return estado.get('pergunta') == 'servico' and _normalizar(texto) not in PULAR and parse_servico(texto) is None
+
+
+def normalizar_placa(placa):
+    """'abc-1d23' -> 'ABC1D23' (como no nome do arquivo da OS, sem o hífen)."""
+    return re.sub(r'[\s-]', '', placa or '').upper()
+
+
+def normalizar_documento(documento):
+    return re.sub(r'\D', '', documento or '')
+
+
+def parece_placa(texto):
+    return bool(_RE_PLACA.match(normalizar_placa(texto)))
+
+
+def parece_documento(texto):
+    texto = (texto or '').strip()
+    return bool(_RE_DOCUMENTO.match(texto)) and len(normalizar_documento(texto)) in (11, 14)
+
+
+def identificar_pergunta(texto):
+    """Id da pergunta do roteiro presente em uma mensagem do assistente, ou None."""
+    texto = _normalizar(texto)
+    for trecho, pergunta in TRECHOS_DAS_PERGUNTAS:
+        if trecho in texto:
+            return pergunta
+    return None
+
+
+def novo_estado():
+    return {
+        'pergunta': 'cliente_nome',
+        'corrigindo': False,
+        'dados': copy.deepcopy(DADOS_VAZIOS),
+        'servico_atual': None,
+    }
+
+
+def iniciar():
+    """Retorna (estado, mensagem de saudação) de uma nova conversa."""
+    return novo_estado(), f"{SAUDACAO}\n\n{TEXTOS['cliente_nome']}"
+
+
+def preencher_oficina(estado, oficina):
+    """
+    Oficina já cadastrada: os campos do Bloco 5 vêm preenchidos e o bloco não é
+    perguntado (o Bloco 4 termina direto no resumo). A correção 'oficina' continua valendo.
+    """
+    estado['dados']['oficina'].update(oficina)
+    estado['oficina_cadastrada'] = True
+
+
+def validar_estado(estado):
+    if not isinstance(estado, dict) or estado.get('pergunta') not in BLOCO_DA_PERGUNTA:
+        raise EstadoInvalido("Estado da conversa inválido.")
+    if not isinstance(estado.get('dados'), dict):
+        raise EstadoInvalido("Estado da conversa sem dados.")
+    return estado
+
+
+def _formatar_valor(valor):
+    try:
+        return f"{float(valor):.2f}"
+    except (ValueError, TypeError):
+        return "0.00"
+
+
+def resumo(dados):
+    """Mensagem do Bloco 6 (resumo) seguida da pergunta do Bloco 7."""
+    oficina, cliente, veiculo = dados['oficina'], dados['cliente'], dados['veiculo']
+    logo = "Sim" if oficina.get('logo_data_base64') else "Não"
+    modelo = f"{veiculo.get('marca', '')} {veiculo.get('modelo', '')}".strip()
+
+    linhas = [
+        "OK, dados coletados. Aqui está um resumo para sua revisão: 📝",
+        "",
+        "**Resumo da OS:**",
+        "**Oficina:**",
+        f"- Nome: {oficina.get('nome') or '-'}",
+        f"- CNPJ: {oficina.get('cnpj') or '-'}",
+        f"- Logo: {logo}",
+        "**Cliente:**",
+        f"- Nome: {cliente.get('nome') or '-'}",
+        f"- Telefone: {cliente.get('telefone') or '-'}",
+        "**Veículo:**",
+        f"- Placa: {veiculo.get('placa') or '-'}",
+        f"- Modelo: {modelo or '-'}",
+        "**Serviços/Venda:**",
+    ]
+    if dados['servicos']:
+        for i, item in enumerate(dados['servicos'], start=1):
+            linhas.append(f"{i}. {item.get('descricao') or '-'}, {item.get('responsavel') or '-'}, R$ {_formatar_valor(item.get('valor'))}")
+    else:
+        linhas.append("- Nenhum")
+    linhas += [
+        "**Observações:**",
+        f"- {dados.get('observacoes') or '-'}",
+        "",
+        TEXTOS['confirmacao'],
+    ]
+    return "\n".join(linhas)
+
+
+def _perguntar(estado, pergunta, prefixo=None, texto=None):
+    estado['pergunta'] = pergunta
+    texto = texto or TEXTOS[pergunta]
+    return f"{prefixo}\n\n{texto}" if prefixo else texto
+
+
+def mensagem_do_cadastro(cadastro):
+    """Dados encontrados pela placa (ou pelo documento), seguidos da pergunta de confirmação."""
+    cliente, veiculo = cadastro.get('cliente'), cadastro.get('veiculo')
+    linhas = ["Encontrei este cadastro: 📝"]
+    if cliente:
+        campos_cliente = [cliente.get(c) for c in ('nome', 'telefone', 'documento', 'endereco')]
+        linhas.append(f"**Cliente:** {' · '.join(c for c in campos_cliente if c) or '-'}")
+    if veiculo:
+        modelo = f"{veiculo.get('marca', '')} {veiculo.get('modelo', '')}".strip()
+        campos_veiculo = [veiculo.get('placa'), modelo, veiculo.get('ano')]
+        linhas.append(f"**Veículo:** {' · '.join(c for c in campos_veiculo if c) or '-'}")
+    if cliente and veiculo:
+        pergunta = TEXTOS['cadastro_confirmacao']
+    else:
+        pergunta = f"Usar estes dados do {'cliente' if cliente else 'veículo'}? (s/n)"
+    return "\n".join(linhas + ["", pergunta])
+
+
+def oferecer_cadastro(estado, texto, buscar_cadastro):
+    """
+    Resposta com placa (ou CPF/CNPJ, na primeira pergunta) de um cliente já cadastrado:
+    `buscar_cadastro(placa, documento)` devolve {'cliente', 'veiculo'} ou None.
+    Se encontrar, os dados são mostrados para o usuário só confirmar. Só é oferecido
+    o bloco da pergunta atual e, se ainda estiver em branco, o outro: nada que o
+    usuário já respondeu é trocado. Retorna a mensagem, ou None quando a resposta
+    segue o roteiro normal.
+    """
+    pergunta = estado['pergunta']
+    dados = estado['dados']
+    placa = normalizar_placa(texto) if parece_placa(texto) else None
+    documento = normalizar_documento(texto) if pergunta == 'cliente_nome' and parece_documento(texto) else None
+    if not placa and not documento:
+        return None
+
+    cadastro = buscar_cadastro(placa, documento) or {}
+    cliente = cadastro.get('cliente') if pergunta == 'cliente_nome' or not any(dados['cliente'].values()) else None
+    veiculo = cadastro.get('veiculo') if pergunta == 'veiculo_placa' or not any(dados['veiculo'].values()) else None
+    encontrado = cliente if pergunta == 'cliente_nome' else veiculo
+    if not encontrado:
+        if pergunta == 'cliente_nome':
+            return _perguntar(estado, 'cliente_nome', texto=f"Não encontrei {texto.strip()} no cadastro. {TEXTOS['cliente_nome']}")
+        # Placa nova: é só a resposta da pergunta
+        return None
+
+    estado['cadastro'] = {'pergunta': pergunta, 'texto': texto.strip(), 'cliente': cliente, 'veiculo': veiculo}
+    return _perguntar(estado, 'cadastro_confirmacao', texto=mensagem_do_cadastro(estado['cadastro']))
+
+
+def confirmar_cadastro(estado, mensagem):
+    """
+    Resposta à confirmação do cadastro. Retorna (mensagem, dados aplicados): com 's',
+    os blocos oferecidos são preenchidos; com 'n', volta à pergunta original. Para
+    qualquer outra resposta retorna (None, None) e descarta a oferta: a resposta
+    vale para a pergunta do roteiro (ver _seguir_sem_cadastro).
+    """
+    comando = _normalizar(mensagem)
+    cadastro = estado.get('cadastro')
+    if cadastro is None:
+        # Ex: estado refeito a partir do histórico, sem os dados do cadastro
+        if comando in SIM or comando in NAO or comando in PULAR:
+            return _perguntar(estado, 'cliente_nome'), None
+        return None, None
+
+    if comando in SIM:
+        estado.pop('cadastro')
+        aplicados = {secao: cadastro[secao] for secao in ('cliente', 'veiculo') if cadastro[secao]}
+        for secao, valores in aplicados.items():
+            estado['dados'][secao].update(valores)
+        return _fim_do_bloco(estado, 2 if 'veiculo' in aplicados else 1), aplicados
+
+    if comando in NAO or comando in PULAR:
+        estado.pop('cadastro')
+        if cadastro['pergunta'] == 'veiculo_placa':
+            # A placa digitada vale; o restante do veículo é perguntado
+            estado['dados']['veiculo']['placa'] = cadastro['texto']
+            return _perguntar(estado, 'veiculo_modelo'), None
+        return _perguntar(estado, 'cliente_nome', prefixo="Ok, vamos preencher os dados do cliente."), None
+
+    return None, None
+
+
+def _seguir_sem_cadastro(estado):
+    """
+    A confirmação foi ignorada (o usuário seguiu respondendo o roteiro): a oferta é
+    descartada e a pergunta pendente volta a ser a do roteiro. Depois da placa do
+    Bloco 2, a placa digitada vale e a resposta é a da pergunta seguinte.
+    """
+    cadastro = estado.pop('cadastro', None)
+    if cadastro and cadastro['pergunta'] == 'veiculo_placa':
+        estado['dados']['veiculo']['placa'] = cadastro['texto']
+        estado['pergunta'] = 'veiculo_modelo'
+    else:
+        estado['pergunta'] = 'cliente_nome'
+
+
+def _mostrar_resumo(estado):
+    estado['pergunta'] = 'confirmacao'
+    estado['corrigindo'] = False
+    return resumo(estado['dados'])
+
+
+def _fim_do_bloco(estado, bloco):
+    """
+    Regra do roteiro: ao terminar um bloco, volta ao resumo se veio da correção (ou do Bloco 5,
+    ou do Bloco 4 quando a oficina já está cadastrada).
+    """
+    if estado['corrigindo'] or bloco == 5 or (bloco == 4 and estado.get('oficina_cadastrada')):
+        return _mostrar_resumo(estado)
+    return _perguntar(estado, INICIO_DO_BLOCO[bloco + 1])
+
+
+def _proximo_passo_do_servico(estado):
+    """Pergunta o que ainda falta no serviço atual ou o adiciona à lista."""
+    atual = estado['servico_atual']
+    if not atual.get('descricao'):
+        return _perguntar(estado, 'servico_descricao')
+    if atual.get('valor') in (None, ''):
+        return _perguntar(estado, 'servico_valor')
+    if 'responsavel' not in atual:
+        return _perguntar(estado, 'servico_responsavel')
+
+    estado['dados']['servicos'].append({
+        'descricao': atual['descricao'],
+        'responsavel': atual.get('responsavel', ''),
+        'valor': atual['valor'],
+    })
+    estado['servico_atual'] = None
+    return _perguntar(estado, 'servico_mais')
+
+
+def processar(estado, mensagem, interpretar_servico=None, buscar_cadastro=None):
+    """
+    Aplica a resposta do usuário à pergunta pendente.
+    Retorna (resposta, finalizar); `finalizar` é True quando o usuário confirmou
+    no Bloco 7 e `estado['dados']` já está pronto para gerar o PDF.
+
+    `interpretar_servico(texto)` é chamado apenas quando a linha de serviço
+    não pode ser separada localmente; deve retornar um dict com
+    descricao/valor/responsavel (campos ausentes são perguntados depois).
+    `buscar_cadastro(placa, documento)`, quando informado, procura o cliente
+    pela placa (ou pelo CPF/CNPJ) respondido no início dos Blocos 1 e 2.
+    """
+    validar_estado(estado)
+    pergunta = estado['pergunta']
+    dados = estado['dados']
+    texto = (mensagem or '').strip()
+    comando = _normalizar(texto)
+    pulou = comando in PULAR
+
+    # --- Cliente já cadastrado (Blocos 1 e 2) ---
+    if pergunta in PERGUNTAS_DO_CADASTRO and buscar_cadastro and not pulou:
+        resposta = oferecer_cadastro(estado, texto, buscar_cadastro)
+        if resposta:
+            return resposta, False
+
+    if pergunta == 'cadastro_confirmacao':
+        resposta, _ = confirmar_cadastro(estado, mensagem)
+        if resposta:
+            return resposta, False
+        _seguir_sem_cadastro(estado)
+        return processar(estado, mensagem, interpretar_servico, buscar_cadastro)
+
+    # --- Campos de texto simples ---
+    if pergunta in CAMPOS_SIMPLES:
+        secao, campo, proxima = CAMPOS_SIMPLES[pergunta]
+        dados[secao][campo] = "" if pulou else texto
+        if proxima:
+            return _perguntar(estado, proxima), False
+        return _fim_do_bloco(estado, BLOCO_DA_PERGUNTA[pergunta]), False
+
+    if pergunta == 'veiculo_modelo':
+        marca, _, modelo = ("" if pulou else texto).partition(' ')
+        dados['veiculo']['marca'] = marca
+        dados['veiculo']['modelo'] = modelo.strip()
+        return _perguntar(estado, 'veiculo_ano'), False
+
+    # --- Bloco 3: Serviços ---
+    if pergunta == 'servico':
+        if pulou:
+            return _fim_do_bloco(estado, 3), False
+        item = parse_servico(texto)
+        if item is None and interpretar_servico:
+            item = interpretar_servico(texto)
+        if item is None:
+            # Sem como separar: usa o texto como descrição e pergunta o valor
+            item = {'descricao': texto}
+        estado['servico_atual'] = {
+            'descricao': (item.get('descricao') or '').strip(),
+            'valor': item.get('valor'),
+        }
+        if item.get('responsavel'):
+            estado['servico_atual']['responsavel'] = item['responsavel'].strip()
+        return _proximo_passo_do_servico(estado), False
+
+    if pergunta == 'servico_descricao':
+        estado['servico_atual']['descricao'] = '-' if pulou else texto
+        return _proximo_passo_do_servico(estado), False
+
+    if pergunta == 'servico_valor':
+        valor = 0.0 if pulou else parse_valor(texto)
+        if valor is None:
+            return _perguntar(estado, 'servico_valor', texto="Não entendi o valor. Qual o valor? (Ex: 500 ou 1.200,50)"), False
+        estado['servico_atual']['valor'] = valor
+        return _proximo_passo_do_servico(estado), False
+
+    if pergunta == 'servico_responsavel':
+        estado['servico_atual']['responsavel'] = "" if pulou else texto
+        return _proximo_passo_do_servico(estado), False
+
+    if pergunta == 'servico_mais':
+        if comando in SIM:
+            return _perguntar(estado, 'servico', texto=TEXTO_PROXIMO_SERVICO), False
+        if comando in NAO or pulou:
+            return _fim_do_bloco(estado, 3), False
+        return _perguntar(estado, 'servico_mais', texto="Responda 's' para adicionar outro serviço ou 'n' para continuar."), False
+
+    # --- Bloco 4: Observações ---
+    if pergunta == 'obs_quer':
+        if comando in SIM:
+            return _perguntar(estado, 'obs_texto'), False
+        if comando in NAO or pulou:
+            dados['observacoes'] = ""
+            return _fim_do_bloco(estado, 4), False
+        # O usuário já digitou a observação direto
+        dados['observacoes'] = texto
+        return _fim_do_bloco(estado, 4), False
+
+    if pergunta == 'obs_texto':
+        dados['observacoes'] = "" if pulou else texto
+        return _fim_do_bloco(estado, 4), False
+
+    # --- Bloco 5: Oficina ---
+    if pergunta == 'oficina_endereco':
+        endereco = "" if pulou else texto
+        dados['oficina']['endereco'] = endereco
+        dados['oficina']['cidade_estado'] = endereco
+        return _perguntar(estado, 'oficina_telefone'), False
+
+    if pergunta == 'oficina_logo':
+        if texto == '[LOGO_ANEXADO]':
+            dados['oficina']['logo_data_base64'] = '[LOGO_PLACEHOLDER]'
+        elif pulou or comando in NAO:
+            dados['oficina']['logo_data_base64'] = ""
+        else:
+            return _perguntar(estado, 'oficina_logo'), False
+        return _fim_do_bloco(estado, 5), False
+
+    # --- Bloco 7: Correção ---
+    if pergunta == 'confirmacao':
+        if comando in SIM:
+            estado['pergunta'] = FINALIZADO
+            return None, True
+        for palavra, bloco, resposta in CORRECOES:
+            if palavra in comando:
+                estado['corrigindo'] = True
+                if bloco == 3:
+                    # O bloco de serviços recomeça do zero
+                    dados['servicos'] = []
+                    estado['servico_atual'] = None
+                return _perguntar(estado, INICIO_DO_BLOCO[bloco], prefixo=resposta), False
+        return _perguntar(estado, 'confirmacao'), False
+
+    raise EstadoInvalido(f"Pergunta desconhecida: {pergunta}")
+
+
+def aplicar_resposta(estado, pergunta, resposta):
+    """
+    Aplica uma resposta já dada a `pergunta`, sem gerar a próxima mensagem.
+    Usado para reconstruir os campos coletados a partir de um histórico conduzido pela IA,
+    que nem sempre faz todas as perguntas do serviço (ex: responsável já informado).
+    """
+    atual = estado.get('servico_atual')
+    if pergunta in PERGUNTAS_DO_SERVICO_ATUAL:
+        if atual is None:
+            return
+    elif atual is not None:
+        # A IA seguiu adiante: o serviço em andamento entra com o que já foi informado
+        estado['dados']['servicos'].append({
+            'descricao': atual.get('descricao') or '-',
+            'responsavel': atual.get('responsavel', ''),
+            'valor': atual.get('valor') or 0.0,
+        })
+        estado['servico_atual'] = None
+
+    estado['pergunta'] = pergunta
+    processar(estado, resposta)
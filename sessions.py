@@ -0,0 +1,124 @@
+import json
+import time
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class SessaoExpirada(Exception):
+    """O session_id enviado pelo cliente não existe ou já expirou."""
+
+
+class SessionStore:
+    """
+    Sessões de conversa do lado do servidor.
+    Mantém um LRU em memória com expiração por TTL e grava cada alteração
+    na tabela `sessions` do SQLite, para que um restart não perca as conversas.
+
+    O cache guarda o JSON gravado, não o dict: cada `get` devolve uma cópia nova. Um
+    turno que altera a sessão e falha antes do `save` não deixa na memória um estado
+    que não está no banco.
+
+    Com `compartilhado` (vários workers no mesmo banco), o cache só é usado se a
+    sessão não foi gravada por outro processo desde então: cada `get` confere o
+    updated_at da linha, uma consulta pela chave primária, bem mais barata que
+    ler e decodificar o histórico.
+    """
+
+    def __init__(self, db_name, max_items=500, ttl_seconds=3600, compartilhado=False):
+        self.db_name = db_name
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.compartilhado = compartilhado
+        self._cache = OrderedDict()  # session_id -> (JSON gravado, último acesso, updated_at gravado)
+        self._lock = threading.Lock()
+
+    def init_db(self):
+        with db.conexao(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)")
+
+    def _put_cache(self, session_id, texto, agora, gravado_em):
+        with self._lock:
+            self._cache[session_id] = (texto, agora, gravado_em)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def create(self, dados):
+        session_id = uuid.uuid4().hex
+        self.save(session_id, dados)
+        logger.info(f"Sessão {session_id} criada.")
+        return session_id
+
+    def get(self, session_id):
+        agora = time.time()
+        with self._lock:
+            item = self._cache.get(session_id)
+            if item is not None:
+                texto, ultimo_acesso, gravado_em = item
+                if agora - ultimo_acesso > self.ttl_seconds:
+                    del self._cache[session_id]
+                    item = None
+                elif not self.compartilhado:
+                    self._cache[session_id] = (texto, agora, gravado_em)
+                    self._cache.move_to_end(session_id)
+                    return json.loads(texto)
+
+        with db.conexao(self.db_name) as conn:
+            if item is not None:
+                row = conn.execute("SELECT updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is not None and row[0] == gravado_em:
+                    self._put_cache(session_id, texto, agora, gravado_em)
+                    return json.loads(texto)
+
+            # Não está em memória (expirou lá, ou outro worker gravou depois): lê do SQLite
+            row = conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, agora - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            with self._lock:
+                self._cache.pop(session_id, None)
+            return None
+
+        self._put_cache(session_id, row[0], agora, row[1])
+        return json.loads(row[0])
+
+    def save(self, session_id, dados):
+        agora = time.time()
+        texto = json.dumps(dados, ensure_ascii=False)
+        with db.conexao(self.db_name) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, texto, agora)
+            )
+        self._put_cache(session_id, texto, agora, agora)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+        with db.conexao(self.db_name) as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def delete_expired(self):
+        """Remove as sessões sem atividade há mais de `ttl_seconds`. Retorna quantas saíram do banco."""
+        limite = time.time() - self.ttl_seconds
+        with self._lock:
+            for session_id in [sid for sid, (_, acesso, _) in self._cache.items() if acesso < limite]:
+                del self._cache[session_id]
+
+        with db.conexao(self.db_name) as conn:
+            return conn.execute("DELETE FROM sessions WHERE updated_at < ?", (limite,)).rowcount
@@ -0,0 +1,147 @@
+"""
+Tabela de serviços das OS grandes (frotas com centenas de itens).
+
+Uma Table única com um Paragraph por célula fica cara com muitas linhas: cada
+quebra de página refaz o layout de todas as linhas que sobraram, e cada célula
+passa pelo quebrador de linhas do Paragraph. Aqui:
+
+- as células são texto simples; só vira Paragraph o texto que não cabe na coluna;
+- a altura de cada linha é medida uma única vez, e as somas acumuladas dizem
+  quantas linhas cabem na página sem montar tabela nenhuma;
+- cada página recebe uma Table pequena, só com as suas linhas e alturas fixas,
+  terminada pelo subtotal da página e pelo valor a transportar, que abre a próxima.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+from xml.sax.saxutils import escape
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable, Paragraph, Table
+
+import render_context
+
+PADDING_HORIZONTAL = 6  # Padrão da Table (LEFTPADDING/RIGHTPADDING)
+PADDING_VERTICAL = 3    # TOPPADDING/BOTTOMPADDING de TABELA_SERVICOS_GRANDE
+ALTURA_LINHA = render_context.ENTRELINHA_TABELA + 2 * PADDING_VERTICAL
+CABECALHO = ['ITEM', 'DESCRIÇÃO', 'RESPONSÁVEL', 'VALOR (R$)']
+
+
+def _valor(item):
+    try:
+        return float(item.get('valor', 0.0))
+    except (ValueError, TypeError):
+        return 0.0
+
+
+class _Linhas:
+    """Células, alturas acumuladas e valores acumulados de todas as linhas, calculados uma vez."""
+
+    def __init__(self, servicos, larguras):
+        self.larguras = larguras
+        self.celulas = []
+        alturas = []
+        valores = []
+        for i, item in enumerate(servicos):
+            valor = _valor(item)
+            linha = [str(i + 1), self._celula(item.get('descricao', '-'), larguras[1]),
+                     self._celula(item.get('responsavel', '-'), larguras[2]), f"{valor:.2f}"]
+            self.celulas.append(linha)
+            alturas.append(self._altura(linha))
+            valores.append(valor)
+        self.alturas = [0] + list(accumulate(alturas))
+        self.valores = [0.0] + list(accumulate(valores))
+
+    @staticmethod
+    def _celula(texto, largura):
+        texto = str(texto)
+        util = largura - 2 * PADDING_HORIZONTAL
+        if stringWidth(texto, render_context.FONTE_TABELA, render_context.TAMANHO_FONTE_TABELA) <= util:
+            return texto
+        paragrafo = Paragraph(escape(texto), render_context.styles['TableData'])
+        paragrafo.wrap(util, 10 ** 6)
+        return paragrafo
+
+    @staticmethod
+    def _altura(linha):
+        altura = ALTURA_LINHA
+        for celula in linha:
+            if isinstance(celula, Paragraph):
+                altura = max(altura, celula.height + 2 * PADDING_VERTICAL)
+        return altura
+
+    def __len__(self):
+        return len(self.celulas)
+
+
+class TabelaDeServicos(Flowable):
+    """
+    Flowable com as linhas de serviço a partir de `inicio`. Quando não cabe no espaço
+    que resta na página, split() devolve a Table desta página e outra
+    TabelaDeServicos com o restante, que começa pelo valor transportado.
+    """
+
+    def __init__(self, servicos=None, larguras=None, _linhas=None, _inicio=0):
+        super().__init__()
+        self._linhas = _linhas or _Linhas(servicos, larguras or render_context.LARGURAS_SERVICOS)
+        self._inicio = _inicio
+
+    @property
+    def total(self):
+        return self._linhas.valores[-1]
+
+    def _altura_fixa(self, fechamento):
+        """Cabeçalho, linha 'Transportado' (da segunda página em diante) e, ao fechar a página, os subtotais."""
+        return ALTURA_LINHA * (1 + (self._inicio > 0) + 2 * fechamento)
+
+    def wrap(self, availWidth, availHeight):
+        linhas = self._linhas
+        self.width = sum(linhas.larguras)
+        self.height = self._altura_fixa(False) + linhas.alturas[-1] - linhas.alturas[self._inicio]
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        linhas = self._linhas
+        limite = linhas.alturas[self._inicio] + availHeight - self._altura_fixa(True)
+        # Última linha que ainda cabe; pelo menos uma fica para a continuação
+        fim = min(bisect_right(linhas.alturas, limite) - 1, len(linhas) - 1)
+        if fim <= self._inicio:
+            return []
+        return [self._tabela(self._inicio, fim, fechamento=True),
+                TabelaDeServicos(_linhas=linhas, _inicio=fim)]
+
+    def draw(self):
+        tabela = self._tabela(self._inicio, len(self._linhas), fechamento=False)
+        tabela.wrapOn(self.canv, self.width, self.height)
+        tabela.drawOn(self.canv, 0, 0)
+
+    def _tabela(self, inicio, fim, fechamento):
+        linhas = self._linhas
+        dados = [CABECALHO]
+        alturas = [ALTURA_LINHA]
+        subtotais = []  # índices das linhas de subtotal
+
+        if inicio > 0:
+            subtotais.append(len(dados))
+            dados.append(['Transportado', '', '', f"{linhas.valores[inicio]:.2f}"])
+            alturas.append(ALTURA_LINHA)
+
+        dados.extend(linhas.celulas[inicio:fim])
+        alturas.extend(b - a for a, b in zip(linhas.alturas[inicio:fim], linhas.alturas[inicio + 1:fim + 1]))
+
+        if fechamento:
+            subtotais.extend((len(dados), len(dados) + 1))
+            dados.append(['Subtotal da página', '', '', f"{linhas.valores[fim] - linhas.valores[inicio]:.2f}"])
+            dados.append(['A transportar', '', '', f"{linhas.valores[fim]:.2f}"])
+            alturas.extend((ALTURA_LINHA, ALTURA_LINHA))
+
+        # Alturas fixas: a Table não mede as linhas de novo
+        tabela = Table(dados, colWidths=linhas.larguras, rowHeights=alturas, style=render_context.TABELA_SERVICOS_GRANDE)
+        estilo = []
+        for r in subtotais:
+            estilo += [('SPAN', (0, r), (2, r)),
+                       ('ALIGN', (0, r), (2, r), 'RIGHT'),
+                       ('FONTNAME', (0, r), (-1, r), render_context.FONTE_TABELA_NEGRITO),
+                       ('BACKGROUND', (0, r), (-1, r), render_context.COR_SUBTOTAL)]
+        if estilo:
+            tabela.setStyle(estilo)
+        return tabela
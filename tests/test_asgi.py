@@ -0,0 +1,95 @@
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'teste')  # app.py cria o cliente na importação
+
+import pytest
+
+import app
+import asgi
+import roteiro
+from response_cache import ResponseCache
+from sessions import SessionStore
+
+
+@pytest.fixture
+def sessoes(tmp_path, monkeypatch):
+    sessoes = SessionStore(str(tmp_path / 'os_files.db'))
+    sessoes.init_db()
+    monkeypatch.setattr(app, 'sessoes', sessoes)
+    monkeypatch.setattr(app, 'respostas', ResponseCache())
+    monkeypatch.setattr(app, 'ROTEIRO_LOCAL', False)
+    return sessoes
+
+
+def chunk(texto=None, finish_reason=None, usage=None):
+    escolhas = [] if texto is None and finish_reason is None else [
+        SimpleNamespace(delta=SimpleNamespace(content=texto), finish_reason=finish_reason)]
+    return SimpleNamespace(choices=escolhas, usage=usage)
+
+
+def ia_em_stream(conteudo):
+    """Substituto do AsyncOpenAI: o JSON do turno em dois trechos e o chunk final de usage."""
+    async def create(**kwargs):
+        assert kwargs['stream']
+        async def chunks():
+            meio = len(conteudo) // 2
+            yield chunk(conteudo[:meio])
+            yield chunk(conteudo[meio:], finish_reason='stop')
+            yield chunk(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=None))
+        return chunks()
+    return create
+
+
+def post(rota, corpo):
+    """Executa a rota ASGI e devolve (status, corpo da resposta)."""
+    recebido = [{'type': 'http.request', 'body': json.dumps(corpo).encode('utf-8'), 'more_body': False}]
+    enviado = []
+
+    async def receive():
+        return recebido.pop(0) if recebido else {'type': 'http.disconnect'}
+
+    async def send(mensagem):
+        enviado.append(mensagem)
+
+    asyncio.run(rota({'type': 'http', 'method': 'POST', 'path': '/chat/stream'}, receive, send))
+    status = next(m['status'] for m in enviado if m['type'] == 'http.response.start')
+    return status, b''.join(m.get('body', b'') for m in enviado if m['type'] == 'http.response.body').decode('utf-8')
+
+
+def eventos(corpo):
+    """[(evento, dados)] de um corpo Server-Sent Events."""
+    resultado = []
+    for bloco in corpo.strip().split('\n\n'):
+        linhas = dict(linha.split(': ', 1) for linha in bloco.split('\n'))
+        resultado.append((linhas['event'], json.loads(linhas['data'])))
+    return resultado
+
+
+def test_chat_stream_da_ia_termina_em_done_e_salva_a_sessao(sessoes, monkeypatch):
+    history = [{'role': 'assistant', 'content': roteiro.iniciar()[1]},
+               {'role': 'user', 'content': "João"},
+               {'role': 'assistant', 'content': roteiro.TEXTOS['cliente_telefone']}]
+    session_id = sessoes.create({'history': history, 'estado': None, 'pedido': None, 'logo_id': None})
+    conteudo = json.dumps({'mensagem': roteiro.TEXTOS['cliente_endereco'],
+                           'campos': [{'campo': 'cliente.telefone', 'valor': "(21) 99999-8888"}],
+                           'gerar_pdf': False}, ensure_ascii=False)
+    monkeypatch.setattr(asgi.cliente_async.chat.completions, 'create', ia_em_stream(conteudo))
+
+    status, corpo = post(asgi.chat_stream, {'session_id': session_id, 'message': "(21) 99999-8888"})
+
+    assert status == 200
+    recebidos = eventos(corpo)
+    assert {evento for evento, _ in recebidos[:-1]} == {'delta'}
+    assert ''.join(dados['text'] for _, dados in recebidos[:-1]) == roteiro.TEXTOS['cliente_endereco']
+    evento, payload = recebidos[-1]
+    assert evento == 'done'
+    assert payload['message'] == roteiro.TEXTOS['cliente_endereco']
+    assert payload['uso']['prompt_tokens'] == 100
+
+    sessao = sessoes.get(session_id)
+    assert sessao['history'][-2:] == [{'role': 'user', 'content': "(21) 99999-8888"},
+                                      {'role': 'assistant', 'content': roteiro.TEXTOS['cliente_endereco']}]
+    assert sessao['pedido']['cliente']['telefone'] == "(21) 99999-8888"
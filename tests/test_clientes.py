@@ -0,0 +1,128 @@
+import os
+
+os.environ.setdefault('OPENAI_API_KEY', 'teste')  # app.py cria o cliente na importação
+
+import app
+import roteiro
+from clientes import ClienteStore
+
+MARIA = {'nome': "Maria", 'telefone': "(21) 98888-7777", 'documento': "123.456.789-00", 'endereco': "Rua A, 10"}
+UNO = {'placa': "ABC-1D23", 'marca': "Fiat", 'modelo': "Uno", 'ano': "2012"}
+
+
+def loja(tmp_path):
+    clientes = ClienteStore(str(tmp_path / 'os_files.db'))
+    clientes.init_db()
+    return clientes
+
+
+def buscar(clientes):
+    """Como app.buscar_cadastro: pela placa ou, sem ela, pelo CPF/CNPJ."""
+    return lambda placa, documento: clientes.get_por_placa(placa) if placa else clientes.get_por_documento(documento)
+
+
+def test_busca_pela_placa_e_pelo_documento(tmp_path):
+    clientes = loja(tmp_path)
+    assert clientes.save(MARIA, UNO)
+
+    esperado = {'cliente': MARIA, 'veiculo': UNO}
+    assert clientes.get_por_placa("abc1d23") == esperado
+    assert clientes.get_por_placa(" ABC-1D23 ") == esperado
+    assert clientes.get_por_documento("12345678900") == esperado
+    assert clientes.get_por_placa("XYZ9A87") is None
+    assert clientes.get_por_documento("000.000.000-00") is None
+    assert clientes.get_por_placa("") is None
+
+
+def test_cliente_com_varios_veiculos_nao_escolhe_um(tmp_path):
+    clientes = loja(tmp_path)
+    clientes.save(MARIA, UNO)
+    clientes.save(MARIA, {'placa': "DEF4G56", 'marca': "VW", 'modelo': "Gol", 'ano': "2018"})
+
+    assert clientes.get_por_documento(MARIA['documento']) == {'cliente': MARIA, 'veiculo': None}
+    assert clientes.get_por_placa("DEF4G56")['veiculo']['modelo'] == "Gol"
+
+
+def test_atualizacao_do_cliente_vale_para_todos_os_veiculos(tmp_path):
+    clientes = loja(tmp_path)
+    clientes.save(MARIA, UNO)
+    clientes.save(dict(MARIA, telefone="(21) 97777-6666"), {'placa': "DEF4G56"})
+
+    assert clientes.get_por_placa("ABC1D23")['cliente']['telefone'] == "(21) 97777-6666"
+
+
+def test_os_sem_documento_ou_sem_nome_nao_apaga_o_cliente_do_veiculo(tmp_path):
+    clientes = loja(tmp_path)
+    sem_documento = dict(MARIA, documento="")
+    clientes.save(sem_documento, UNO)
+    clientes.save({'nome': ""}, dict(UNO, ano="2013"))
+
+    assert clientes.get_por_placa("ABC1D23") == {'cliente': sem_documento, 'veiculo': dict(UNO, ano="2013")}
+    assert not clientes.save({'nome': "Sem chave"}, {})
+
+
+def test_importar(tmp_path):
+    clientes = loja(tmp_path)
+    itens = [{'cliente': MARIA, 'veiculo': UNO},
+             {'cliente': {'nome': "Sem placa nem documento"}, 'veiculo': {}},
+             {'cliente': {'nome': "João"}, 'veiculo': {'placa': "JKL7M89"}}]
+
+    assert clientes.importar(itens, tamanho_lote=1) == (2, 1)
+    assert clientes.get_por_placa("jkl7m89")['cliente']['nome'] == "João"
+
+
+def test_confirmacao_do_cadastro_preenche_os_blocos_1_e_2(tmp_path):
+    clientes = loja(tmp_path)
+    clientes.save(MARIA, UNO)
+    estado, _ = roteiro.iniciar()
+
+    resposta, _ = roteiro.processar(estado, "abc1d23", buscar_cadastro=buscar(clientes))
+    assert "Maria" in resposta and "Uno" in resposta
+    assert resposta.endswith(roteiro.TEXTOS['cadastro_confirmacao'])
+
+    assert roteiro.processar(estado, "s", buscar_cadastro=buscar(clientes)) == (roteiro.TEXTOS['servico'], False)
+    assert estado['dados']['cliente'] == MARIA
+    assert estado['dados']['veiculo'] == UNO
+
+
+def test_recusar_o_cadastro_pela_placa_do_bloco_2(tmp_path):
+    clientes = loja(tmp_path)
+    clientes.save(MARIA, UNO)
+    estado = roteiro.novo_estado()
+    estado['pergunta'] = 'veiculo_placa'
+    estado['dados']['cliente']['nome'] = "Carlos"
+
+    resposta, _ = roteiro.processar(estado, "ABC1D23", buscar_cadastro=buscar(clientes))
+    # O cliente já respondido não é oferecido
+    assert resposta.endswith("Usar estes dados do veículo? (s/n)")
+    assert "Maria" not in resposta
+
+    assert roteiro.processar(estado, "n") == (roteiro.TEXTOS['veiculo_modelo'], False)
+    assert estado['dados']['cliente']['nome'] == "Carlos"
+    assert estado['dados']['veiculo']['placa'] == "ABC1D23"
+
+
+def test_documento_desconhecido_no_bloco_1_pergunta_o_nome(tmp_path):
+    estado, _ = roteiro.iniciar()
+    resposta, _ = roteiro.processar(estado, "123.456.789-00", buscar_cadastro=buscar(loja(tmp_path)))
+    assert resposta == f"Não encontrei 123.456.789-00 no cadastro. {roteiro.TEXTOS['cliente_nome']}"
+    assert estado['pergunta'] == 'cliente_nome'
+
+
+def test_confirmacao_no_modo_ia(tmp_path, monkeypatch):
+    clientes = loja(tmp_path)
+    clientes.save(MARIA, UNO)
+    monkeypatch.setattr(app, 'clientes', clientes)
+    sessao = {'history': [{'role': 'assistant', 'content': roteiro.iniciar()[1]}],
+              'estado': None, 'pedido': None, 'logo_id': None}
+
+    oferta = app.turno_do_cadastro(sessao, "ABC1D23")
+    assert oferta['message'].endswith(roteiro.TEXTOS['cadastro_confirmacao'])
+    # O que concluir_turno grava no histórico
+    sessao['history'] += [{'role': 'user', 'content': "ABC1D23"}, {'role': 'assistant', 'content': oferta['message']}]
+
+    assert app.turno_do_cadastro(sessao, "s")['message'] == roteiro.TEXTOS['servico']
+    assert sessao['pedido']['cliente'] == MARIA
+    assert sessao['cadastro_aplicado'] == {'cliente': MARIA, 'veiculo': UNO}
+    # A IA recebe os dados já preenchidos
+    assert any('"nome":"Maria"' in m['content'] for m in app.montar_mensagens(sessao, None) if m['role'] == 'system')
@@ -0,0 +1,130 @@
+import copy
+import json
+
+import pytest
+
+import extracao
+import roteiro
+
+
+def dados_vazios():
+    return copy.deepcopy(roteiro.DADOS_VAZIOS)
+
+
+def campos(*pares):
+    return [{'campo': campo, 'valor': valor} for campo, valor in pares]
+
+
+# --- interpretar ---
+
+def test_interpretar_resposta_no_formato():
+    conteudo = json.dumps({'mensagem': "Qual o telefone dele?", 'campos': campos(('cliente.nome', "João")),
+                           'gerar_pdf': False})
+    assert extracao.interpretar(conteudo) == {'mensagem': "Qual o telefone dele?",
+                                              'campos': campos(('cliente.nome', "João")), 'gerar_pdf': False}
+
+
+@pytest.mark.parametrize('conteudo', [
+    '{"mensagem": "Qual o telefone',      # cortada por max_tokens
+    '["mensagem"]',                       # JSON que não é objeto
+    '{"campos": [], "gerar_pdf": true}',  # sem mensagem
+    'Qual o telefone dele?',              # texto livre
+    '',
+    None,
+])
+def test_interpretar_resposta_fora_do_formato_vira_mensagem_sem_campos(conteudo):
+    resposta = extracao.interpretar(conteudo)
+    assert resposta == {'mensagem': conteudo or '', 'campos': [], 'gerar_pdf': False}
+
+
+def test_interpretar_resposta_parcial():
+    # Sem 'campos', com itens que não são objetos e gerar_pdf que não é booleano
+    assert extracao.interpretar('{"mensagem": "Ok"}') == {'mensagem': "Ok", 'campos': [], 'gerar_pdf': False}
+    conteudo = json.dumps({'mensagem': "Ok", 'campos': ["cliente.nome", {'campo': 'cliente.nome', 'valor': "Ana"}],
+                           'gerar_pdf': "true"})
+    assert extracao.interpretar(conteudo) == {'mensagem': "Ok", 'campos': campos(('cliente.nome', "Ana")),
+                                              'gerar_pdf': False}
+
+
+# --- aplicar_campos ---
+
+def test_aplicar_campos_simples_e_sobrescrever():
+    dados = dados_vazios()
+    extracao.aplicar_campos(dados, campos(('cliente.nome', " João "), ('veiculo.placa', "ABC1D23"),
+                                          ('oficina.logo', "[LOGO_PLACEHOLDER]"), ('observacoes', "Urgente")))
+    extracao.aplicar_campos(dados, campos(('cliente.nome', "João da Silva")))
+
+    assert dados['cliente']['nome'] == "João da Silva"
+    assert dados['veiculo']['placa'] == "ABC1D23"
+    assert dados['oficina']['logo_data_base64'] == "[LOGO_PLACEHOLDER]"
+    assert dados['observacoes'] == "Urgente"
+
+
+def test_servicos_em_varios_turnos():
+    dados = dados_vazios()
+    extracao.aplicar_campos(dados, campos(('servico.descricao', "Pintura capô"), ('servico.valor', "1.200,50")))
+    # Turno seguinte: o responsável completa o último serviço
+    extracao.aplicar_campos(dados, campos(('servico.responsavel', "Leo")))
+    extracao.aplicar_campos(dados, campos(('servico.descricao', "Polimento"), ('servico.valor', "R$ 300")))
+
+    assert dados['servicos'] == [{'descricao': "Pintura capô", 'responsavel': "Leo", 'valor': 1200.5},
+                                 {'descricao': "Polimento", 'responsavel': "", 'valor': 300.0}]
+
+
+def test_servico_sem_descricao_ou_com_valor_invalido():
+    dados = dados_vazios()
+    extracao.aplicar_campos(dados, campos(('servico.valor', "quinhentos"), ('servico.responsavel', "Ana")))
+    extracao.aplicar_campos(dados, campos(('servico.descricao', "")))
+
+    assert dados['servicos'] == [{'descricao': "-", 'responsavel': "Ana", 'valor': 0.0},
+                                 {'descricao': "-", 'responsavel': "", 'valor': 0.0}]
+
+
+def test_servicos_limpar_recomeca_a_lista():
+    dados = dados_vazios()
+    extracao.aplicar_campos(dados, campos(('servico.descricao', "Antigo"), ('servicos.limpar', ""),
+                                          ('servico.descricao', "Novo"), ('servico.valor', "50")))
+    assert dados['servicos'] == [{'descricao': "Novo", 'responsavel': "", 'valor': 50.0}]
+
+
+def test_campo_desconhecido_ou_valor_ausente():
+    dados = dados_vazios()
+    extracao.aplicar_campos(dados, [{'campo': 'cliente.cpf', 'valor': "123"}, {'valor': "x"},
+                                    {'campo': 'cliente.telefone', 'valor': None}, {'campo': 'veiculo.ano', 'valor': 2015}])
+    esperado = dados_vazios()
+    esperado['veiculo']['ano'] = "2015"
+    assert dados == esperado
+
+
+# --- LeitorDaMensagem ---
+
+def ler_em_trechos(conteudo, tamanho):
+    leitor = extracao.LeitorDaMensagem()
+    return ''.join(leitor.receber(conteudo[i:i + tamanho]) for i in range(0, len(conteudo), tamanho))
+
+
+@pytest.mark.parametrize('tamanho', [1, 2, 3, 5, 1000])
+def test_leitor_em_qualquer_divisao_dos_trechos(tamanho):
+    mensagem = 'Olá! 🏁 Digite "p"\npara pular \\ ou ç'
+    conteudo = json.dumps({'mensagem': mensagem, 'campos': campos(('cliente.nome', "x\"y")), 'gerar_pdf': False})
+    assert ler_em_trechos(conteudo, tamanho) == mensagem
+    # Também com o JSON sem escapar os não-ASCII
+    conteudo = json.dumps({'mensagem': mensagem, 'campos': [], 'gerar_pdf': False}, ensure_ascii=False)
+    assert ler_em_trechos(conteudo, tamanho) == mensagem
+
+
+def test_leitor_ignora_o_que_vem_depois_da_mensagem():
+    leitor = extracao.LeitorDaMensagem()
+    assert leitor.receber('{"mensagem": "Oi", "campos": [{"campo": "observacoes", "valor": "') == "Oi"
+    assert leitor.receber('texto"}], "gerar_pdf": false}') == ""
+
+
+def test_leitor_sem_campo_mensagem_nao_devolve_nada():
+    leitor = extracao.LeitorDaMensagem()
+    assert leitor.receber('{"campos": [], ') == ""
+    assert leitor.receber('"gerar_pdf": false}') == ""
+
+
+def test_leitor_com_resposta_cortada():
+    # max_tokens no meio de um escape: o que já chegou inteiro é repassado
+    assert ler_em_trechos('{"mensagem": "Qual o tel\\u00e', 4) == "Qual o tel"
@@ -0,0 +1,94 @@
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'teste')  # app.py cria o cliente na importação
+
+import pytest
+
+import app
+import asgi
+import roteiro
+from admissao import ControleDeAdmissao
+from sessions import SessionStore
+
+LINHA = "troquei o parachoque dianteiro por 350 reais, quem fez foi o Leo"
+
+
+@pytest.fixture
+def sessao_no_servico(tmp_path, monkeypatch):
+    """Sessão do roteiro local aguardando a linha de serviço do Bloco 3."""
+    sessoes = SessionStore(str(tmp_path / 'os_files.db'))
+    sessoes.init_db()
+    monkeypatch.setattr(app, 'sessoes', sessoes)
+    monkeypatch.setattr(app, 'admissao', ControleDeAdmissao(max_concorrentes=1, max_fila=0))
+    estado = roteiro.novo_estado()
+    estado['pergunta'] = 'servico'
+    return sessoes.create({'history': [{'role': 'assistant', 'content': roteiro.TEXTOS['servico']}],
+                           'estado': estado, 'pedido': None, 'logo_id': None})
+
+
+def resposta(conteudo):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo), finish_reason='stop')],
+                           usage=SimpleNamespace(prompt_tokens=80, completion_tokens=20, prompt_tokens_details=None))
+
+
+ITEM = json.dumps({'descricao': "Parachoque dianteiro", 'valor': "350", 'responsavel': "Leo"})
+
+
+def test_linha_de_servico_passa_pela_admissao(sessao_no_servico, monkeypatch):
+    chamadas = []
+
+    def create(**kwargs):
+        chamadas.append(kwargs)
+        assert app.admissao.stats()['em_execucao'] == 1
+        return resposta(ITEM)
+    monkeypatch.setattr(app.client.chat.completions, 'create', create)
+
+    r = app.app.test_client().post('/chat', json={'session_id': sessao_no_servico, 'message': LINHA})
+
+    assert r.status_code == 200
+    assert r.get_json()['message'] == roteiro.TEXTOS['servico_mais']
+    assert chamadas[0]['max_tokens'] == app.PARAMETROS_SERVICO['max_tokens']
+    assert app.admissao.stats()['admitidas'] == 1
+    assert app.sessoes.get(sessao_no_servico)['estado']['dados']['servicos'] == [
+        {'descricao': "Parachoque dianteiro", 'responsavel': "Leo", 'valor': 350.0}]
+
+
+def test_sobrecarga_na_linha_de_servico_vira_429(sessao_no_servico, monkeypatch):
+    monkeypatch.setattr(app.client.chat.completions, 'create', lambda **kwargs: pytest.fail("chamou a IA"))
+    ocupada = app.admissao.entrar('outra-sessao', 100)
+
+    r = app.app.test_client().post('/chat', json={'session_id': sessao_no_servico, 'message': LINHA})
+    ocupada.sair()
+
+    assert r.status_code == 429
+    assert r.get_json()['code'] == 'sobrecarga'
+    assert int(r.headers['Retry-After']) >= 1
+    # O turno não foi registrado: a mesma linha pode ser reenviada
+    assert app.sessoes.get(sessao_no_servico)['estado']['pergunta'] == 'servico'
+
+
+def test_asgi_usa_o_cliente_assincrono(sessao_no_servico, monkeypatch):
+    monkeypatch.setattr(app.client.chat.completions, 'create', lambda **kwargs: pytest.fail("usou o cliente síncrono"))
+
+    async def create(**kwargs):
+        assert app.admissao.stats()['em_execucao'] == 1
+        return resposta(ITEM)
+    monkeypatch.setattr(asgi.cliente_async.chat.completions, 'create', create)
+
+    enviado = []
+
+    async def receive():
+        corpo = json.dumps({'session_id': sessao_no_servico, 'message': LINHA}).encode('utf-8')
+        return {'type': 'http.request', 'body': corpo, 'more_body': False}
+
+    async def send(mensagem):
+        enviado.append(mensagem)
+
+    asyncio.run(asgi.chat({'type': 'http', 'method': 'POST', 'path': '/chat'}, receive, send))
+
+    assert enviado[0]['status'] == 200
+    assert json.loads(enviado[1]['body'])['message'] == roteiro.TEXTOS['servico_mais']
+    assert app.admissao.stats()['admitidas'] == 1
@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+import db
+import limpeza as modulo
+from limpeza import LimpezaPDF
+
+UMA_HORA = 60 * 60
+
+
+@pytest.fixture
+def limpeza(tmp_path):
+    db_name = str(tmp_path / 'os_files.db')
+    with db.conexao(db_name) as conn:
+        conn.execute("CREATE TABLE generated_files (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, "
+                     "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    pdf_dir = tmp_path / 'pdf'
+    pdf_dir.mkdir()
+    # Reconcilia a cada varredura
+    limpeza = LimpezaPDF(db_name, str(pdf_dir), max_idade_minutos=5, reconciliar_a_cada=1)
+    limpeza.init_db()
+    return limpeza
+
+
+def pdf(caminho, idade_segundos=0):
+    with open(caminho, 'wb') as f:
+        f.write(b"%PDF-1.4" * 100)
+    mtime = time.time() - idade_segundos
+    os.utime(caminho, (mtime, mtime))
+
+
+def test_pdfs_de_lote_em_andamento_nao_sao_varridos(limpeza):
+    limpeza.cota_bytes = 1  # menor que um único PDF
+    with limpeza.lote_em_andamento() as diretorio:
+        # Lote rodando há uma hora: o primeiro PDF já passou da carência dos órfãos
+        pdf(os.path.join(diretorio, 'OS_1.pdf'), idade_segundos=UMA_HORA)
+        resumo = limpeza.sweep()
+        assert resumo['arquivos_orfaos'] == 0 and resumo['removidos_por_cota'] == 0
+        assert os.path.exists(os.path.join(diretorio, 'OS_1.pdf'))
+
+        limpeza.cota_bytes = 0
+        limpeza.publicar(diretorio, ['OS_1.pdf'])
+        # Publicado e ainda sem registro: a carência conta a partir da publicação
+        assert limpeza.sweep()['arquivos_orfaos'] == 0
+        assert os.path.exists(os.path.join(limpeza.pdf_dir, 'OS_1.pdf'))
+
+    assert not os.path.exists(diretorio)
+
+
+def test_orfao_antigo_na_raiz_e_removido(limpeza):
+    pdf(os.path.join(limpeza.pdf_dir, 'OS_2.pdf'), idade_segundos=UMA_HORA)
+    assert limpeza.sweep()['arquivos_orfaos'] == 1
+    assert not os.path.exists(os.path.join(limpeza.pdf_dir, 'OS_2.pdf'))
+
+
+def test_diretorio_de_lote_abandonado_e_removido(limpeza):
+    abandonado = os.path.join(limpeza.pdf_dir, f"{modulo.PREFIXO_LOTE}antigo")
+    os.mkdir(abandonado)
+    pdf(os.path.join(abandonado, 'OS_3.pdf'))
+    antigo = time.time() - modulo.LOTE_ABANDONADO_SEGUNDOS - UMA_HORA
+    os.utime(abandonado, (antigo, antigo))
+
+    with limpeza.lote_em_andamento() as em_andamento:
+        limpeza.sweep()
+        assert os.path.isdir(em_andamento)
+    assert not os.path.exists(abandonado)
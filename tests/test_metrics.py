@@ -0,0 +1,26 @@
+from metrics import Metricas
+
+
+def test_coletor_exporta_acumulados_como_counter():
+    metricas = Metricas()
+    metricas.registrar_coletor('cache_pdf', lambda: {'hits': 3, 'misses': 1, 'arquivos': 2},
+                               contadores=('hits', 'misses'))
+
+    texto = metricas.exportar()
+
+    assert "# TYPE os_bot_cache_pdf_hits_total counter\nos_bot_cache_pdf_hits_total 3\n" in texto
+    assert "# TYPE os_bot_cache_pdf_misses_total counter\nos_bot_cache_pdf_misses_total 1\n" in texto
+    assert "# TYPE os_bot_cache_pdf_arquivos gauge\nos_bot_cache_pdf_arquivos 2\n" in texto
+    assert "os_bot_cache_pdf_hits " not in texto
+
+
+def test_contador_descrito_sai_com_help_e_type():
+    metricas = Metricas()
+    metricas.descrever('cadastro_clientes_total', 'counter', 'Buscas no cadastro de clientes.')
+    metricas.contar('cadastro_clientes_total', resultado='novo')
+
+    linhas = metricas.exportar().splitlines()
+
+    assert linhas == ["# HELP os_bot_cadastro_clientes_total Buscas no cadastro de clientes.",
+                      "# TYPE os_bot_cadastro_clientes_total counter",
+                      'os_bot_cadastro_clientes_total{resultado="novo"} 1']
@@ -0,0 +1,96 @@
+import os
+
+os.environ.setdefault('OPENAI_API_KEY', 'teste')  # app.py cria o cliente na importação
+
+import app
+import roteiro
+from oficinas import OficinaStore, MAX_TOKEN
+
+ZE = {'nome': "Oficina do Zé", 'cnpj': "12.345.678/0001-90", 'endereco': "Rua B, 20",
+      'cidade_estado': "Rio - RJ", 'telefone': "(21) 3333-4444", 'logo_data_base64': "[LOGO_PLACEHOLDER]"}
+DADOS_ZE = {campo: ZE[campo] for campo in ('nome', 'cnpj', 'endereco', 'cidade_estado', 'telefone')}
+
+
+def loja(tmp_path):
+    oficinas = OficinaStore(str(tmp_path / 'os_files.db'))
+    oficinas.init_db()
+    return oficinas
+
+
+def test_perfil_so_sai_com_o_token(tmp_path):
+    oficinas = loja(tmp_path)
+    token = oficinas.save(ZE, logo_id='logo1')
+
+    assert len(token) > 20
+    # O logo fica à parte, pelo logo_id
+    assert oficinas.get(token) == {'dados': DADOS_ZE, 'logo_id': 'logo1'}
+    assert oficinas.get("outro-token") is None
+    assert oficinas.get(ZE['cnpj']) is None
+    for invalido in (None, "", 123, ["token"], "x" * (MAX_TOKEN + 1)):
+        assert oficinas.get(invalido) is None
+
+
+def test_atualizar_o_perfil_pelo_mesmo_token(tmp_path):
+    oficinas = loja(tmp_path)
+    token = oficinas.save(ZE, logo_id='logo1')
+
+    assert oficinas.save(dict(ZE, telefone="(21) 2222-1111"), logo_id=None, token=token) == token
+    assert oficinas.get(token) == {'dados': dict(DADOS_ZE, telefone="(21) 2222-1111"), 'logo_id': None}
+
+
+def test_varios_tokens_da_mesma_oficina(tmp_path):
+    oficinas = loja(tmp_path)
+    login = oficinas.save(ZE, token="login-do-ze")
+    emitido = oficinas.save(dict(ZE, cnpj="12345678000190", nome="Zé Funilaria"))
+
+    assert login == "login-do-ze" and emitido != login
+    # Mesmo CNPJ (só dígitos): um perfil só, atualizado pelos dois
+    assert oficinas.get(login)['dados']['nome'] == "Zé Funilaria"
+    assert oficinas.get(emitido) == oficinas.get(login)
+
+
+def test_token_passa_para_outra_oficina(tmp_path):
+    oficinas = loja(tmp_path)
+    token = oficinas.save(ZE)
+    oficinas.save(dict(ZE, cnpj="98.765.432/0001-10", nome="Outra"), token=token)
+
+    assert oficinas.get(token)['dados']['nome'] == "Outra"
+
+
+def test_oficina_sem_cnpj_nao_tem_perfil(tmp_path):
+    oficinas = loja(tmp_path)
+    assert oficinas.save(dict(ZE, cnpj="")) is None
+    assert oficinas.save(dict(ZE, cnpj="sem numero")) is None
+
+
+def test_token_de_login_muito_longo_e_trocado(tmp_path):
+    oficinas = loja(tmp_path)
+    token = oficinas.save(ZE, token="x" * (MAX_TOKEN + 1))
+    assert len(token) <= MAX_TOKEN
+    assert oficinas.get(token)['dados'] == DADOS_ZE
+
+
+def test_sessao_com_o_token_pula_o_bloco_5(tmp_path, monkeypatch):
+    oficinas = loja(tmp_path)
+    monkeypatch.setattr(app, 'oficinas', oficinas)
+    token = oficinas.save(ZE)
+
+    sessao = {'history': [], 'estado': None, 'pedido': None, 'logo_id': None}
+    app.carregar_oficina(sessao, token)
+    assert sessao['oficina_token'] == token
+    assert sessao['pedido']['oficina'] == dict(DADOS_ZE, logo_data_base64='')
+
+    app.turno_local('sessao', sessao, None)
+    sessao['estado']['pergunta'] = 'obs_quer'
+    resposta = app.turno_local('sessao', sessao, "n")['message']
+    assert resposta == roteiro.resumo(sessao['estado']['dados'])
+    assert sessao['estado']['dados']['oficina']['nome'] == "Oficina do Zé"
+
+
+def test_token_sem_perfil_fica_na_sessao(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'oficinas', loja(tmp_path))
+    sessao = {'history': [], 'estado': None, 'pedido': None, 'logo_id': None}
+
+    app.carregar_oficina(sessao, "login-novo")
+    # Na primeira OS, o perfil é salvo com este token
+    assert sessao == {'history': [], 'estado': None, 'pedido': None, 'logo_id': None, 'oficina_token': "login-novo"}
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from pdf_store import PDFStore
+
+REQUISICOES = 8
+
+
+def esperar(condicao, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "tempo esgotado"
+        time.sleep(0.005)
+
+
+def test_downloads_simultaneos_renderizam_uma_vez_e_soltam_o_lock():
+    store = PDFStore()
+    liberar = threading.Event()
+    renderizacoes = []
+
+    def renderizar(buffer):
+        renderizacoes.append(1)
+        liberar.wait(5)
+        buffer.write(b"%PDF-1.4 OS 42")
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(store.get('os42', renderizar)))
+               for _ in range(REQUISICOES)]
+    for t in threads:
+        t.start()
+
+    # Todas as requisições contadas no mesmo lock antes de a renderização terminar
+    esperar(lambda: store._renderizando.get('os42', [None, 0])[1] == REQUISICOES)
+    liberar.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(renderizacoes) == 1
+    assert resultados == [b"%PDF-1.4 OS 42"] * REQUISICOES
+    assert store.stats()['misses'] == 1
+    # A última requisição a sair remove a entrada da chave
+    assert store._renderizando == {}
+
+
+def test_lock_e_solto_quando_a_renderizacao_falha():
+    store = PDFStore()
+
+    def falhar(buffer):
+        raise RuntimeError("reportlab")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            store.get('os43', falhar)
+    assert store._renderizando == {}
+    assert store.get('os43', lambda buffer: buffer.write(b"%PDF")) == b"%PDF"
+    assert store._renderizando == {}
@@ -0,0 +1,30 @@
+import os
+import time
+import subprocess
+import sys
+
+import render_cache
+from render_cache import RenderCache
+
+
+def temp(diretorio, chave, pid, idade_segundos=0):
+    caminho = diretorio / f"{chave}.pdf.{pid}.140000.tmp"
+    caminho.write_bytes(b"%PDF")
+    mtime = time.time() - idade_segundos
+    os.utime(caminho, (mtime, mtime))
+    return caminho
+
+
+def test_inicio_so_remove_temporarios_abandonados(tmp_path):
+    processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+    processo.wait()
+
+    em_andamento = temp(tmp_path, 'a1', os.getpid())
+    de_processo_morto = temp(tmp_path, 'b2', processo.pid)
+    antigo = temp(tmp_path, 'c3', os.getpid(), idade_segundos=render_cache.TEMP_MAX_IDADE_SEGUNDOS + 60)
+
+    RenderCache(str(tmp_path))
+
+    assert em_andamento.exists()
+    assert not de_processo_morto.exists()
+    assert not antigo.exists()
@@ -0,0 +1,65 @@
+import os
+import json
+
+os.environ.setdefault('OPENAI_API_KEY', 'teste')  # app.py cria o cliente na importação
+
+import pytest
+
+import app
+import roteiro
+from response_cache import ResponseCache
+
+TELEFONE = "(21) 99999-8888"
+
+
+@pytest.fixture(autouse=True)
+def cache_vazio(monkeypatch):
+    monkeypatch.setattr(app, 'respostas', ResponseCache())
+
+
+def sessao_no_telefone(nome):
+    """Sessão do modo IA aguardando a resposta de 'Qual o telefone dele?'."""
+    return {
+        'history': [
+            {'role': 'assistant', 'content': roteiro.iniciar()[1]},
+            {'role': 'user', 'content': nome},
+            {'role': 'assistant', 'content': roteiro.TEXTOS['cliente_telefone']},
+        ],
+        'estado': None, 'pedido': None, 'logo_id': None,
+    }
+
+
+def resposta_da_ia(mensagem, campos=()):
+    return json.dumps({'mensagem': mensagem, 'campos': [{'campo': c, 'valor': v} for c, v in campos],
+                       'gerar_pdf': False}, ensure_ascii=False)
+
+
+def test_mesmo_passo_em_outra_sessao_usa_o_cache():
+    joao, maria = sessao_no_telefone("João"), sessao_no_telefone("Maria")
+    assert app.resposta_em_cache(joao, TELEFONE) is None
+    app.guardar_resposta(joao, TELEFONE, resposta_da_ia(roteiro.TEXTOS['cliente_endereco'],
+                                                         [('cliente.telefone', TELEFONE)]), 'stop')
+
+    # Outra conversa, outro nome, espaços diferentes: mesmo passo do roteiro e mesma resposta
+    payload = app.resposta_em_cache(maria, f" {TELEFONE}  ")
+    assert payload['message'] == roteiro.TEXTOS['cliente_endereco']
+    assert maria['pedido']['cliente']['nome'] == "Maria"
+    assert maria['pedido']['cliente']['telefone'] == TELEFONE
+    assert app.respostas.stats()['hits'] == 1
+
+
+def test_outra_resposta_ou_correcao_nao_usa_o_cache():
+    sessao = sessao_no_telefone("João")
+    app.guardar_resposta(sessao, TELEFONE, resposta_da_ia(roteiro.TEXTOS['cliente_endereco']), 'stop')
+    assert app.resposta_em_cache(sessao_no_telefone("Ana"), "(21) 3333-4444") is None
+
+    corrigindo = sessao_no_telefone("Ana")
+    corrigindo['history'][1:1] = [{'role': 'assistant', 'content': roteiro.TEXTOS['confirmacao']},
+                                  {'role': 'user', 'content': "cliente"}]
+    assert app.resposta_em_cache(corrigindo, TELEFONE) is None
+
+
+def test_resumo_nao_e_guardado():
+    sessao = sessao_no_telefone("João")
+    app.guardar_resposta(sessao, TELEFONE, resposta_da_ia(roteiro.resumo(roteiro.novo_estado()['dados'])), 'stop')
+    assert app.respostas.stats()['itens'] == 0
@@ -0,0 +1,194 @@
+import copy
+
+import pytest
+
+import roteiro
+from roteiro import TEXTOS
+
+
+def responder(estado, *mensagens, **kwargs):
+    """Aplica as respostas em sequência e devolve a última (resposta, finalizar)."""
+    for mensagem in mensagens:
+        resultado = roteiro.processar(estado, mensagem, **kwargs)
+    return resultado
+
+
+def no_passo(pergunta, **campos):
+    estado = roteiro.novo_estado()
+    estado['pergunta'] = pergunta
+    estado.update(campos)
+    return estado
+
+
+def test_roteiro_completo_monta_a_os():
+    estado, saudacao = roteiro.iniciar()
+    assert saudacao.endswith(TEXTOS['cliente_nome'])
+
+    passos = [
+        ("João da Silva", TEXTOS['cliente_telefone']),
+        ("(21) 99999-8888", TEXTOS['cliente_endereco']),
+        ("Rua A, 10", TEXTOS['cliente_documento']),
+        ("123.456.789-00", TEXTOS['veiculo_placa']),
+        ("ABC-1D23", TEXTOS['veiculo_modelo']),
+        ("Fiat Palio Weekend", TEXTOS['veiculo_ano']),
+        ("2015", TEXTOS['servico']),
+        ("Pintura capô, R$ 1.200,50, Leo", TEXTOS['servico_mais']),
+        ("s", roteiro.TEXTO_PROXIMO_SERVICO),
+        ("Polimento, 300", TEXTOS['servico_responsavel']),
+        ("p", TEXTOS['servico_mais']),
+        ("n", TEXTOS['obs_quer']),
+        ("sim", TEXTOS['obs_texto']),
+        ("Cliente aguarda", TEXTOS['oficina_nome']),
+        ("Oficina do Zé", TEXTOS['oficina_cnpj']),
+        ("12.345.678/0001-90", TEXTOS['oficina_endereco']),
+        ("Rua B, 20 - Centro, Rio - RJ", TEXTOS['oficina_telefone']),
+        ("(21) 3333-4444", TEXTOS['oficina_logo']),
+    ]
+    for mensagem, pergunta in passos:
+        resposta, finalizar = roteiro.processar(estado, mensagem)
+        assert (resposta, finalizar) == (pergunta, False), mensagem
+
+    resposta, finalizar = roteiro.processar(estado, "[LOGO_ANEXADO]")
+    assert resposta == roteiro.resumo(estado['dados']) and not finalizar
+    assert estado['pergunta'] == 'confirmacao'
+
+    assert roteiro.processar(estado, "Sim!") == (None, True)
+    assert estado['pergunta'] == roteiro.FINALIZADO
+    assert estado['dados'] == {
+        'oficina': {'nome': "Oficina do Zé", 'cnpj': "12.345.678/0001-90", 'endereco': "Rua B, 20 - Centro, Rio - RJ",
+                    'cidade_estado': "Rua B, 20 - Centro, Rio - RJ", 'telefone': "(21) 3333-4444",
+                    'logo_data_base64': '[LOGO_PLACEHOLDER]'},
+        'cliente': {'nome': "João da Silva", 'telefone': "(21) 99999-8888", 'documento': "123.456.789-00",
+                    'endereco': "Rua A, 10"},
+        'veiculo': {'marca': "Fiat", 'modelo': "Palio Weekend", 'ano': "2015", 'placa': "ABC-1D23"},
+        'servicos': [{'descricao': "Pintura capô", 'responsavel': "Leo", 'valor': 1200.5},
+                     {'descricao': "Polimento", 'responsavel': "", 'valor': 300.0}],
+        'observacoes': "Cliente aguarda",
+    }
+
+
+def test_pular_tudo_deixa_os_campos_vazios():
+    estado, _ = roteiro.iniciar()
+    # Bloco 1 (4), Bloco 2 (3), Bloco 3, Bloco 4 e Bloco 5 (5)
+    resposta, _ = responder(estado, *['p'] * 4, *['pular'] * 3, 'p', 'n', *['p'] * 5)
+    assert estado['pergunta'] == 'confirmacao'
+    assert resposta == roteiro.resumo(roteiro.DADOS_VAZIOS)
+    assert estado['dados'] == roteiro.DADOS_VAZIOS
+
+
+@pytest.mark.parametrize('pergunta, mensagem, esperado', [
+    ('servico_valor', "quinhentos", "Não entendi o valor. Qual o valor? (Ex: 500 ou 1.200,50)"),
+    ('servico_mais', "talvez", "Responda 's' para adicionar outro serviço ou 'n' para continuar."),
+    ('oficina_logo', "não sei", TEXTOS['oficina_logo']),
+    ('confirmacao', "hmm", TEXTOS['confirmacao']),
+])
+def test_resposta_invalida_repete_a_pergunta(pergunta, mensagem, esperado):
+    estado = no_passo(pergunta, servico_atual={'descricao': "Pintura"})
+    antes = copy.deepcopy(estado['dados'])
+
+    assert roteiro.processar(estado, mensagem) == (esperado, False)
+    assert estado['pergunta'] == pergunta
+    assert estado['dados'] == antes
+
+
+@pytest.mark.parametrize('estado', [None, {}, {'pergunta': 'inexistente', 'dados': {}}, {'pergunta': 'servico'}])
+def test_estado_invalido(estado):
+    with pytest.raises(roteiro.EstadoInvalido):
+        roteiro.processar(estado, "x")
+
+
+def test_servico_fora_do_formato_usa_a_ia_e_pergunta_o_que_falta():
+    chamadas = []
+
+    def interpretar(texto):
+        chamadas.append(texto)
+        return {'descricao': "Troca de óleo", 'valor': None}
+
+    estado = no_passo('servico')
+    assert responder(estado, "fiz a troca de óleo", interpretar_servico=interpretar) == (TEXTOS['servico_valor'], False)
+    assert chamadas == ["fiz a troca de óleo"]
+    assert roteiro.precisa_interpretar_servico(no_passo('servico'), "fiz a troca de óleo")
+
+    assert responder(estado, "150", "Ana") == (TEXTOS['servico_mais'], False)
+    assert estado['dados']['servicos'] == [{'descricao': "Troca de óleo", 'responsavel': "Ana", 'valor': 150.0}]
+
+
+def test_servico_sem_ia_vira_descricao():
+    estado = no_passo('servico')
+    assert roteiro.processar(estado, "troca de óleo") == (TEXTOS['servico_valor'], False)
+    assert estado['servico_atual'] == {'descricao': "troca de óleo", 'valor': None}
+
+
+@pytest.mark.parametrize('mensagem', ["p", "Pintura, 500", "Pintura capô, R$ 1.200,50, Leo"])
+def test_servico_no_formato_nao_precisa_da_ia(mensagem):
+    assert not roteiro.precisa_interpretar_servico(no_passo('servico'), mensagem)
+    assert not roteiro.precisa_interpretar_servico(no_passo('servico_valor'), "qualquer coisa")
+
+
+def test_correcao_de_servicos_recomeca_o_bloco_e_volta_ao_resumo():
+    estado = no_passo('confirmacao')
+    estado['dados']['servicos'] = [{'descricao': "Antigo", 'responsavel': "", 'valor': 1.0}]
+
+    resposta, _ = roteiro.processar(estado, "servicos")
+    assert resposta == f"Ok, vamos corrigir os serviços.\n\n{TEXTOS['servico']}"
+    assert estado['dados']['servicos'] == [] and estado['corrigindo']
+
+    resposta, _ = responder(estado, "Pintura, 500, Leo", "n")
+    assert resposta == roteiro.resumo(estado['dados'])
+    assert estado['pergunta'] == 'confirmacao' and not estado['corrigindo']
+
+
+def test_oficina_cadastrada_pula_o_bloco_5():
+    estado, _ = roteiro.iniciar()
+    roteiro.preencher_oficina(estado, {'nome': "Oficina do Zé", 'cnpj': "12.345.678/0001-90"})
+    estado['pergunta'] = 'obs_quer'
+
+    resposta, _ = roteiro.processar(estado, "n")
+    assert resposta == roteiro.resumo(estado['dados'])
+    assert "- Nome: Oficina do Zé" in resposta
+
+
+def test_observacao_digitada_direto():
+    estado = no_passo('obs_quer')
+    assert roteiro.processar(estado, "Entregar sexta") == (TEXTOS['oficina_nome'], False)
+    assert estado['dados']['observacoes'] == "Entregar sexta"
+
+
+CADASTRO = {'cliente': {'nome': "Maria", 'telefone': "(21) 98888-7777", 'documento': "", 'endereco': ""},
+            'veiculo': {'placa': "ABC1D23", 'marca': "Fiat", 'modelo': "Uno", 'ano': "2012"}}
+
+
+def test_placa_conhecida_no_bloco_1_preenche_cliente_e_veiculo():
+    estado, _ = roteiro.iniciar()
+    resposta, _ = roteiro.processar(estado, "abc-1d23", buscar_cadastro=lambda placa, documento: CADASTRO)
+    assert estado['pergunta'] == 'cadastro_confirmacao'
+    assert resposta.endswith(TEXTOS['cadastro_confirmacao'])
+
+    assert roteiro.processar(estado, "s") == (TEXTOS['servico'], False)
+    assert estado['dados']['cliente'] == CADASTRO['cliente']
+    assert estado['dados']['veiculo'] == CADASTRO['veiculo']
+
+
+def test_resposta_que_nao_e_s_ou_n_segue_o_roteiro():
+    estado, _ = roteiro.iniciar()
+    roteiro.processar(estado, "ABC1D23", buscar_cadastro=lambda placa, documento: CADASTRO)
+
+    # O usuário ignorou a oferta e digitou o nome
+    assert roteiro.processar(estado, "Carlos") == (TEXTOS['cliente_telefone'], False)
+    assert estado['dados']['cliente']['nome'] == "Carlos"
+    assert 'cadastro' not in estado
+
+
+def test_placa_desconhecida_no_bloco_2_e_so_a_resposta():
+    estado = no_passo('veiculo_placa')
+    assert roteiro.processar(estado, "XYZ9A87", buscar_cadastro=lambda placa, documento: None) == (
+        TEXTOS['veiculo_modelo'], False)
+    assert estado['dados']['veiculo']['placa'] == "XYZ9A87"
+
+
+@pytest.mark.parametrize('texto, valor', [
+    ("500", 500.0), ("1.200", 1200.0), ("1.200,50", 1200.5), ("R$ 99,90", 99.9), ("1200.50", 1200.5),
+    ("abc", None), ("", None),
+])
+def test_parse_valor(texto, valor):
+    assert roteiro.parse_valor(texto) == valor
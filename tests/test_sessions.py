@@ -0,0 +1,18 @@
+from sessions import SessionStore
+
+
+def test_turno_sem_save_nao_altera_a_sessao(tmp_path):
+    sessoes = SessionStore(str(tmp_path / 'os_files.db'))
+    sessoes.init_db()
+    session_id = sessoes.create({'history': [], 'pedido': None})
+
+    # Turno que falha depois de alterar a sessão e antes do save
+    sessao = sessoes.get(session_id)
+    sessao['history'].append({'role': 'user', 'content': "João"})
+
+    assert sessoes.get(session_id) == {'history': [], 'pedido': None}
+
+    sessao = sessoes.get(session_id)
+    sessao['history'].append({'role': 'user', 'content': "Maria"})
+    sessoes.save(session_id, sessao)
+    assert sessoes.get(session_id)['history'] == [{'role': 'user', 'content': "Maria"}]
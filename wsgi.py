@@ -0,0 +1,20 @@
+"""
+Ponto de entrada WSGI para produção com vários workers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Cada worker importa este módulo e prepara o próprio agendador de limpeza; quem
+varre de fato é só o worker que detém o lease 'limpeza' no SQLite (lideranca.py).
+As sessões ficam em memória em cada worker, conferidas contra o banco a cada turno.
+"""
+import os
+
+# Um turno pode cair em um worker diferente do anterior
+os.environ.setdefault('SESSOES_COMPARTILHADAS', '1')
+
+from app import app, iniciar_servicos  # noqa: E402 (depois do setdefault acima)
+
+# `app` é o que o gunicorn carrega (wsgi:app)
+__all__ = ['app']
+
+iniciar_servicos()